@@ -0,0 +1,350 @@
+"""
+Module for offline anomaly scoring of logged traffic.
+
+This module is a batch job that scores every user and every client IP seen
+in a time range. Logs are streamed from MongoDB sorted by creation time in
+fixed-size cursor batches and converted to NumPy arrays, so memory is bounded
+by the chunk size plus a fixed amount of state per entity, never by the
+number of logs. Each chunk is folded into per-entity accumulators with
+vectorized operations, weighting the aggregates of collapsed repeated
+events by their `count`:
+
+    - request rate: per-window counts are folded as windows close, keeping
+      the sum, sum of squares and peak per entity.
+    - status code entropy: a per-entity histogram of status codes.
+    - URL diversity: a per-entity HyperLogLog sketch of distinct URLs.
+    - off-hours activity: the count of requests outside working hours.
+
+The peak window rate is turned into a z-score against the entity's own
+windows, the other features into z-scores against the population, and the
+results are written back to the "anomaly_scores" collection with bulk
+upserts.
+
+Usage:
+    python anomaly.py --start 2026-10-18 --end 2026-10-19
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - hashlib: hashlib module for hashing URLs.
+    - datetime from datetime: datetime class for working with dates and times.
+    - timedelta from datetime: timedelta class for representing durations.
+    - numpy: NumPy module for vectorized computations.
+    - UpdateOne from pymongo: UpdateOne class for bulk upserts.
+    - AnomalyScore from app.database: AnomalyScore collection from the MongoDB
+      database.
+    - Log from app.database: Log collection from the MongoDB database.
+
+Classes:
+    - EntityFeatures: Per-entity feature accumulators for one entity kind.
+
+Functions:
+    - read_chunks(start, end, chunk_size): Function to stream logs as column
+      arrays.
+    - score_range(start, end, window, chunk_size, off_hours): Function to
+      compute the anomaly scores of a time range.
+    - write_scores(kind, features, start, end): Function to upsert the scores
+      of one entity kind.
+    - main(): Command line entry point.
+
+"""
+
+import argparse
+import hashlib
+from datetime import datetime, timedelta
+
+import numpy as np
+from pymongo import UpdateOne
+
+from database import AnomalyScore, Log
+
+HLL_PRECISION = 7
+HLL_REGISTERS = 1 << HLL_PRECISION
+BULK_SIZE = 1000
+
+
+def _zscore(values: np.ndarray) -> np.ndarray:
+    std = values.std()
+    if not std:
+        return np.zeros_like(values, dtype=np.float64)
+    return (values - values.mean()) / std
+
+
+def _hash_urls(urls: np.ndarray) -> np.ndarray:
+    uniques, inverse = np.unique(urls, return_inverse=True)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(str(url).encode('utf-8'),
+                                        digest_size=8).digest(), 'little')
+         for url in uniques), dtype=np.uint64, count=len(uniques))
+    return hashes[inverse]
+
+
+class EntityFeatures:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.ids: dict[str, int] = {}
+        self.codes: dict[int, int] = {}
+        self.size = 0
+        self.window = -1
+        capacity = 1024
+        self.window_counts = np.zeros(capacity, dtype=np.int64)
+        self.total = np.zeros(capacity, dtype=np.int64)
+        self.sum_squares = np.zeros(capacity, dtype=np.int64)
+        self.peak = np.zeros(capacity, dtype=np.int64)
+        self.off_hours = np.zeros(capacity, dtype=np.int64)
+        self.status = np.zeros((capacity, 8), dtype=np.int64)
+        self.registers = np.zeros((capacity, HLL_REGISTERS), dtype=np.uint8)
+
+    def _grow(self, size: int):
+        capacity = len(self.total)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ('window_counts', 'total', 'sum_squares', 'peak',
+                     'off_hours', 'status', 'registers'):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _entity_ids(self, keys: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(keys, return_inverse=True)
+        mapped = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques):
+            entity = self.ids.get(key)
+            if entity is None:
+                entity = self.ids[key] = len(self.ids)
+            mapped[i] = entity
+        self.size = len(self.ids)
+        self._grow(self.size)
+        return mapped[inverse]
+
+    def _status_columns(self, status: np.ndarray) -> np.ndarray:
+        uniques, inverse = np.unique(status, return_inverse=True)
+        mapped = np.empty(len(uniques), dtype=np.int64)
+        for i, code in enumerate(uniques.tolist()):
+            column = self.codes.get(code)
+            if column is None:
+                column = self.codes[code] = len(self.codes)
+            mapped[i] = column
+        if len(self.codes) > self.status.shape[1]:
+            grown = np.zeros((len(self.status), 2 * len(self.codes)),
+                             dtype=np.int64)
+            grown[:, :self.status.shape[1]] = self.status
+            self.status = grown
+        return mapped[inverse]
+
+    def _close_window(self):
+        counts = self.window_counts[:self.size]
+        self.total[:self.size] += counts
+        self.sum_squares[:self.size] += counts * counts
+        np.maximum(self.peak[:self.size], counts, out=self.peak[:self.size])
+        counts[:] = 0
+
+    def update(self, keys: np.ndarray, windows: np.ndarray,
+               status: np.ndarray, url_hashes: np.ndarray,
+               off_hours: np.ndarray, counts: np.ndarray):
+        present = keys != ''
+        if not present.any():
+            return
+        keys, windows, status = keys[present], windows[present], \
+            status[present]
+        url_hashes, off_hours = url_hashes[present], off_hours[present]
+        counts = counts[present]
+        entities = self._entity_ids(keys)
+
+        # Rows arrive sorted by time, so windows close in order.
+        bounds = np.flatnonzero(np.diff(windows)) + 1
+        for chunk in np.split(np.arange(len(windows)), bounds):
+            window = int(windows[chunk[0]])
+            if window != self.window:
+                if self.window >= 0:
+                    self._close_window()
+                self.window = window
+            self.window_counts[:self.size] += np.bincount(
+                entities[chunk], weights=counts[chunk],
+                minlength=self.size).astype(np.int64)
+
+        self.off_hours[:self.size] += np.bincount(
+            entities, weights=off_hours * counts,
+            minlength=self.size).astype(np.int64)
+        np.add.at(self.status, (entities, self._status_columns(status)),
+                  counts)
+
+        buckets = (url_hashes >> np.uint64(64 - HLL_PRECISION)).astype(
+            np.int64)
+        rest = (url_hashes >> np.uint64(32 - HLL_PRECISION)) & \
+            np.uint64(0xFFFFFFFF)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        ranks = (33 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, (entities, buckets), ranks)
+
+    def finish(self, windows: int) -> dict[str, np.ndarray]:
+        if self.window >= 0:
+            self._close_window()
+            self.window = -1
+        size = self.size
+        total = self.total[:size].astype(np.float64)
+
+        # The peak window of each entity against its own windows, so steady
+        # traffic scores zero whatever its volume.
+        windows = max(windows, 1)
+        mean_rate = total / windows
+        std_rate = np.sqrt(np.maximum(
+            self.sum_squares[:size] / windows - mean_rate ** 2, 0.0))
+        peak = self.peak[:size].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate_z = np.where(std_rate > 0,
+                              (peak - mean_rate) / std_rate, 0.0)
+
+        status = self.status[:size, :len(self.codes)].astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = status / np.maximum(total, 1)[:, None]
+            entropy = -np.where(shares > 0, shares * np.log2(shares), 0.0)
+        entropy = entropy.sum(axis=1)
+
+        registers = self.registers[:size].astype(np.float64)
+        alpha = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+        estimate = alpha * HLL_REGISTERS ** 2 / np.exp2(-registers).sum(
+            axis=1)
+        empty = (registers == 0).sum(axis=1)
+        small = (estimate <= 2.5 * HLL_REGISTERS) & (empty > 0)
+        estimate[small] = HLL_REGISTERS * np.log(
+            HLL_REGISTERS / empty[small])
+        diversity = estimate / np.maximum(total, 1)
+
+        off_hours = self.off_hours[:size] / np.maximum(total, 1)
+
+        features = {
+            'request_count': total,
+            'peak_window_rate': peak,
+            'rate_z': rate_z,
+            'status_entropy': entropy,
+            'status_entropy_z': _zscore(entropy),
+            'distinct_urls': estimate,
+            'url_diversity': diversity,
+            'url_diversity_z': _zscore(diversity),
+            'off_hours_ratio': off_hours,
+            'off_hours_z': _zscore(off_hours),
+        }
+        features['score'] = np.max(np.stack([
+            features['rate_z'], features['status_entropy_z'],
+            features['url_diversity_z'], features['off_hours_z']]), axis=0)
+        return features
+
+
+def read_chunks(start: datetime, end: datetime, chunk_size: int):
+    cursor = Log.find(
+        {'created_at': {'$gte': start, '$lt': end}},
+        {'_id': 0, 'created_at': 1, 'client_ip': 1, 'status_code': 1,
+         'url': 1, 'url_id': 1, 'user.id': 1, 'user._id': 1, 'count': 1},
+        batch_size=chunk_size).sort('created_at', 1)
+    rows = []
+    for log in cursor:
+        rows.append(log)
+        if len(rows) == chunk_size:
+            yield _columns(rows)
+            rows = []
+    if rows:
+        yield _columns(rows)
+
+
+def _columns(rows: list) -> dict[str, np.ndarray]:
+    users = []
+    for log in rows:
+        user = log.get('user') or {}
+        users.append(str(user.get('id') or user.get('_id') or ''))
+    return {
+        'created_at': np.array([log['created_at'] for log in rows],
+                               dtype='datetime64[ms]'),
+        'client_ip': np.array([log.get('client_ip') or '' for log in rows],
+                              dtype=object),
+        'status_code': np.array([log.get('status_code') or 0
+                                 for log in rows], dtype=np.int64),
+        'url': np.array([str(log.get('url_id') or log.get('url') or '')
+                         for log in rows], dtype=object),
+        'user': np.array(users, dtype=object),
+        'count': np.array([log.get('count') or 1 for log in rows],
+                          dtype=np.int64),
+    }
+
+
+def score_range(start: datetime, end: datetime, window: timedelta,
+                chunk_size: int, off_hours: tuple[int, int]):
+    users = EntityFeatures('user')
+    ips = EntityFeatures('ip')
+    origin = np.datetime64(start, 'ms')
+    step = np.timedelta64(int(window.total_seconds() * 1000), 'ms')
+    first, last = off_hours
+    for columns in read_chunks(start, end, chunk_size):
+        windows = ((columns['created_at'] - origin) // step).astype(np.int64)
+        hours = columns['created_at'].astype('datetime64[h]').astype(
+            np.int64) % 24
+        if first > last:
+            outside = (hours >= first) | (hours < last)
+        else:
+            outside = (hours >= first) & (hours < last)
+        url_hashes = _hash_urls(columns['url'])
+        for features, keys in ((users, columns['user']),
+                               (ips, columns['client_ip'])):
+            features.update(keys, windows, columns['status_code'],
+                            url_hashes, outside.astype(np.float64),
+                            columns['count'])
+    windows = max(1, int(np.ceil((end - start) / window)))
+    return {'user': users, 'ip': ips}, windows
+
+
+def write_scores(kind: str, features: EntityFeatures, start: datetime,
+                 end: datetime, windows: int) -> int:
+    scores = features.finish(windows)
+    keys = list(features.ids)
+    now = datetime.utcnow()
+    requests = []
+    written = 0
+    for i, key in enumerate(keys):
+        values = {name: float(column[i]) for name, column in scores.items()}
+        values['updated_at'] = now
+        requests.append(UpdateOne(
+            {'kind': kind, 'key': key, 'period_start': start,
+             'period_end': end},
+            {'$set': values}, upsert=True))
+        if len(requests) == BULK_SIZE:
+            AnomalyScore.bulk_write(requests, ordered=False)
+            written += len(requests)
+            requests = []
+    if requests:
+        AnomalyScore.bulk_write(requests, ordered=False)
+        written += len(requests)
+    return written
+
+
+def main():
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0,
+                                      microsecond=0)
+    parser = argparse.ArgumentParser(
+        description='Compute per-user and per-IP anomaly scores.')
+    parser.add_argument('--start', type=datetime.fromisoformat,
+                        default=today - timedelta(days=1),
+                        help='Start of the range (UTC, default yesterday).')
+    parser.add_argument('--end', type=datetime.fromisoformat, default=None,
+                        help='End of the range (UTC, default start + 1 day).')
+    parser.add_argument('--window-minutes', type=int, default=15,
+                        help='Length of a request rate window.')
+    parser.add_argument('--chunk-size', type=int, default=100_000,
+                        help='Number of logs processed per chunk.')
+    parser.add_argument('--off-hours', type=int, nargs=2, default=(20, 7),
+                        metavar=('FROM', 'TO'),
+                        help='Off-hours interval in UTC hours.')
+    args = parser.parse_args()
+    end = args.end or args.start + timedelta(days=1)
+
+    entities, windows = score_range(
+        args.start, end, timedelta(minutes=args.window_minutes),
+        args.chunk_size, tuple(args.off_hours))
+    for kind, features in entities.items():
+        written = write_scores(kind, features, args.start, end, windows)
+        print(f'Scored {written} {kind} entities')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Module for the columnar archive tier of logs.
+
+This module moves logs older than the retention period out of MongoDB into
+compressed Parquet files on local disk, and scans those files back for
+historical queries. Files are partitioned by day using hive-style
+directories (`date=YYYY-MM-DD`), so a time range query only opens the
+partitions it overlaps, and only the requested columns are read from them.
+Aggregates of collapsed repeated events keep their `count`, `first_seen`
+and `last_seen` columns, so archiving them loses no events.
+
+Logs are archived in batches: a batch is written to disk first and only then
+deleted from MongoDB, so a failure never loses data. If the process stops
+between the two steps, the batch is archived again on the next run. Files
+are named after the first log they hold, so the same batch overwrites its
+own files, and scans skip rows whose `id` was already returned, so a batch
+archived twice with different boundaries is still only read once.
+
+Usage:
+    python archive.py --days 30
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - os: os module for working with file paths.
+    - datetime from datetime: datetime class for working with dates and times.
+    - timedelta from datetime: timedelta class for representing durations.
+    - pyarrow: Arrow module for building columnar tables.
+    - pyarrow.dataset: Arrow dataset module for scanning archive files.
+    - pyarrow.parquet: Parquet module for writing archive files.
+    - log_cache from app.cache: Result cache of log listings.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+    - Log from app.database: Log collection from the MongoDB database.
+    - discount_logs from app.facets: Function for subtracting archived logs
+      from the hourly log counters.
+    - resolveLogUrls from app.serializers.logSerializers: Function for filling
+      in the URL of log documents.
+
+Attributes:
+    - ARCHIVE_SCHEMA (pa.Schema): Schema of the archive files.
+
+Functions:
+    - archive_logs(retention_days, batch_size): Function to move old logs
+      from MongoDB to the archive.
+    - scan_archive(start, end, columns, filters, limit): Function to read
+      archived logs in a time range.
+    - main(): Command line entry point.
+
+"""
+
+import argparse
+import os
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cache import log_cache
+from config import settings
+from database import Log
+from facets import discount_logs
+from serializers.logSerializers import resolveLogUrls
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('id', pa.string()),
+    ('created_at', pa.timestamp('ms')),
+    ('updated_at', pa.timestamp('ms')),
+    ('request_type', pa.string()),
+    ('url', pa.string()),
+    ('client_ip', pa.string()),
+    ('status_code', pa.int32()),
+    ('user_id', pa.string()),
+    ('user_email', pa.string()),
+    ('count', pa.int64()),
+    ('first_seen', pa.timestamp('ms')),
+    ('last_seen', pa.timestamp('ms')),
+])
+PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]),
+                               flavor='hive')
+
+
+def _archive_row(log) -> dict:
+    user = log.get('user') or {}
+    user_id = user.get('id') or user.get('_id')
+    return {
+        'id': str(log['_id']),
+        'created_at': log['created_at'],
+        'updated_at': log.get('updated_at'),
+        'request_type': log.get('request_type'),
+        'url': log.get('url'),
+        'client_ip': log.get('client_ip'),
+        'status_code': log.get('status_code'),
+        'user_id': str(user_id) if user_id else None,
+        'user_email': user.get('email'),
+        'count': log.get('count') or 1,
+        'first_seen': log.get('first_seen'),
+        'last_seen': log.get('last_seen'),
+    }
+
+
+def _write_batch(logs: list):
+    partitions: dict[str, list] = {}
+    for log in resolveLogUrls(logs):
+        day = log['created_at'].strftime('%Y-%m-%d')
+        partitions.setdefault(day, []).append(_archive_row(log))
+    for day, rows in partitions.items():
+        directory = os.path.join(settings.ARCHIVE_DIR, f'date={day}')
+        os.makedirs(directory, exist_ok=True)
+        table = pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA)
+        pq.write_table(table, os.path.join(
+            directory, f'part-{rows[0]["id"]}.parquet'),
+            compression='zstd')
+    Log.delete_many({'_id': {'$in': [log['_id'] for log in logs]}})
+    discount_logs(logs)
+    log_cache.bump_shared()
+
+
+def archive_logs(retention_days: int, batch_size: int) -> int:
+    cutoff = (datetime.utcnow() - timedelta(days=retention_days)).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    cursor = Log.find({'created_at': {'$lt': cutoff}},
+                      batch_size=batch_size).sort('created_at', 1)
+    archived = 0
+    batch = []
+    for log in cursor:
+        batch.append(log)
+        if len(batch) == batch_size:
+            _write_batch(batch)
+            archived += len(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+        archived += len(batch)
+    return archived
+
+
+def scan_archive(start: datetime, end: datetime,
+                 columns: list[str] | None = None,
+                 filters: dict | None = None, limit: int = 1000) -> list:
+    if not os.path.isdir(settings.ARCHIVE_DIR):
+        return []
+    dataset = ds.dataset(settings.ARCHIVE_DIR, format='parquet',
+                         schema=ARCHIVE_SCHEMA.append(
+                             pa.field('date', pa.string())),
+                         partitioning=PARTITIONING)
+    # The partition bounds prune whole directories, the timestamp bounds
+    # prune row groups and rows inside the remaining files.
+    expression = (
+        (ds.field('date') >= start.strftime('%Y-%m-%d')) &
+        (ds.field('date') <= end.strftime('%Y-%m-%d')) &
+        (ds.field('created_at') >= pa.scalar(start, pa.timestamp('ms'))) &
+        (ds.field('created_at') < pa.scalar(end, pa.timestamp('ms'))))
+    for name, value in (filters or {}).items():
+        if value is not None:
+            expression = expression & (ds.field(name) == value)
+    names = list(columns or ARCHIVE_SCHEMA.names)
+    scanner = dataset.scanner(
+        columns=names if 'id' in names else names + ['id'],
+        filter=expression)
+    seen = set()
+    logs = []
+    for batch in scanner.to_batches():
+        for row in batch.to_pylist():
+            if row['id'] in seen:
+                continue
+            seen.add(row['id'])
+            if 'id' not in names:
+                del row['id']
+            logs.append(row)
+            if len(logs) == limit:
+                return logs
+    return logs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Move old logs from MongoDB to the Parquet archive.')
+    parser.add_argument('--days', type=int,
+                        default=settings.LOG_RETENTION_DAYS,
+                        help='Number of days of logs kept in MongoDB.')
+    parser.add_argument('--batch-size', type=int,
+                        default=settings.ARCHIVE_BATCH_SIZE,
+                        help='Number of logs written per archive file.')
+    args = parser.parse_args()
+    archived = archive_logs(args.days, args.batch_size)
+    print(f'Archived {archived} logs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Module for in-process caching.
+
+This module provides a thread-safe LRU cache and a versioned result cache
+for log listings. The versioned cache keeps a write version counter that is
+bumped on every log write. Entries are keyed by an ETag built from the
+current version and the normalized query, so a write makes every previous
+entry unreachable at once and stale entries simply age out of the LRU.
+Since the ETag can be computed without running the query, a client that
+already holds the current page gets `304 Not Modified` without re-encoding
+anything.
+
+The in-process counter starts over on restart, so the ETag also carries a
+random epoch drawn when the process starts: ETags issued by a previous
+process never match again. Writes made by other processes (such as the
+archive job and the URL backfill) bump a shared version stored in the
+"cache_versions" collection instead, which is part of the ETag too. The
+API reads it back at most every `LOG_CACHE_SYNC_SECONDS`, so such writes
+show up within that delay while ingest keeps a single round trip.
+
+Dependencies:
+    - hashlib: hashlib module for hashing cache keys.
+    - secrets: secrets module for drawing the process epoch.
+    - threading: threading module for guarding concurrent access.
+    - time: time module for timing shared version reads.
+    - OrderedDict from collections: OrderedDict class for the LRU cache.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+    - CacheVersion from app.database: CacheVersion collection from the
+      MongoDB database.
+
+Classes:
+    - LRUCache: Thread-safe least recently used cache.
+    - VersionedCache: Result cache invalidated by a write version counter.
+
+Attributes:
+    - log_cache (VersionedCache): Result cache for log listings.
+
+"""
+
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from config import settings
+from database import CacheVersion
+
+
+class LRUCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.items: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+
+class VersionedCache:
+    def __init__(self, name: str, maxsize: int, sync_seconds: float):
+        self.name = name
+        self.epoch = secrets.token_hex(4)
+        self.version = 0
+        self.shared_version = 0
+        self.synced_at: float | None = None
+        self.sync_seconds = sync_seconds
+        self.lock = threading.Lock()
+        self.entries = LRUCache(maxsize)
+
+    def bump(self):
+        with self.lock:
+            self.version += 1
+
+    def bump_shared(self):
+        CacheVersion.update_one({'_id': self.name},
+                                {'$inc': {'version': 1}}, upsert=True)
+
+    def _shared(self) -> int:
+        now = time.monotonic()
+        if self.synced_at is None or now - self.synced_at >= self.sync_seconds:
+            row = CacheVersion.find_one({'_id': self.name})
+            self.shared_version = row['version'] if row else 0
+            self.synced_at = now
+        return self.shared_version
+
+    def etag(self, **params) -> str:
+        key = repr(sorted((name, value) for name, value in params.items()
+                          if value is not None))
+        digest = hashlib.blake2b(key.encode('utf-8'),
+                                 digest_size=12).hexdigest()
+        return (f'W/"{self.epoch}.{self.version}.{self._shared()}'
+                f'-{digest}"')
+
+    def get(self, etag: str) -> bytes | None:
+        return self.entries.get(etag)
+
+    def put(self, etag: str, body: bytes):
+        self.entries.put(etag, body)
+
+
+log_cache = VersionedCache('logs', settings.LOG_CACHE_SIZE,
+                           settings.LOG_CACHE_SYNC_SECONDS)
@@ -21,6 +21,43 @@ Attributes:
     - CLIENT_ORIGIN (str): The origin of the client.
     - MONGO_INITDB_ROOT_USERNAME (str): The username for the MongoDB root user.
     - MONGO_INITDB_ROOT_PASSWORD (str): The password for the MongoDB root user.
+    - IDEMPOTENCY_WINDOW_SECONDS (int): The length of a duplicate suppression
+      window for ingested logs.
+    - IDEMPOTENCY_FILTER_CAPACITY (int): The expected number of idempotency
+      keys per window.
+    - IDEMPOTENCY_FILTER_ERROR_RATE (float): The target false positive rate
+      of the duplicate suppression filter.
+    - ARCHIVE_DIR (str): The directory of the columnar log archive.
+    - LOG_RETENTION_DAYS (int): The number of days logs are kept in MongoDB
+      before being archived.
+    - ARCHIVE_BATCH_SIZE (int): The number of logs moved to the archive per
+      batch.
+    - PROFILE_SAMPLE_RATE (float): The fraction of requests profiled at
+      random.
+    - PROFILE_TOKEN (str): The value of the `X-Profile` header that requests a
+      profile.
+    - PROFILE_SLOW_MS (int): The duration above which a sampled request's
+      profile is kept.
+    - PROFILE_DIR (str): The directory of stored request profiles.
+    - PROFILE_MAX_FILES (int): The maximum number of stored request profiles.
+    - URL_CACHE_SIZE (int): The number of URLs kept in the in-process URL
+      cache.
+    - LOG_CACHE_SIZE (int): The number of log listing pages kept in the
+      in-process result cache.
+    - LOG_CACHE_SYNC_SECONDS (float): The interval at which the result cache
+      reads back the version of logs written by other processes.
+    - SAMPLING_WINDOW_SECONDS (int): The length of a sampling window for
+      repeated logs.
+    - SAMPLING_KEEP_PER_WINDOW (int): The number of repeated logs stored as
+      is per window before they are collapsed.
+    - SAMPLING_FLUSH_EVERY (int): The number of collapsed logs buffered before
+      their aggregate is updated.
+    - FACET_EXACT_LIMIT (int): The number of matching logs up to which facet
+      counts are computed exactly.
+    - FACET_SAMPLE_SIZE (int): The number of logs sampled to estimate facet
+      counts of broad filters.
+    - COUNTER_FLUSH_EVERY (int): The number of logs buffered before the
+      hourly log counters are updated.
 
 Classes:
     - Settings (BaseSettings): Class for defining configuration settings.
@@ -47,6 +84,32 @@ class Settings(BaseSettings):
     MONGO_INITDB_ROOT_USERNAME: str
     MONGO_INITDB_ROOT_PASSWORD: str
 
+    IDEMPOTENCY_WINDOW_SECONDS: int = 3600
+    IDEMPOTENCY_FILTER_CAPACITY: int = 1_000_000
+    IDEMPOTENCY_FILTER_ERROR_RATE: float = 0.001
+
+    ARCHIVE_DIR: str = './archive'
+    LOG_RETENTION_DAYS: int = 30
+    ARCHIVE_BATCH_SIZE: int = 100_000
+
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_TOKEN: str | None = None
+    PROFILE_SLOW_MS: int = 500
+    PROFILE_DIR: str = './profiles'
+    PROFILE_MAX_FILES: int = 100
+
+    URL_CACHE_SIZE: int = 100_000
+    LOG_CACHE_SIZE: int = 1024
+    LOG_CACHE_SYNC_SECONDS: float = 5.0
+
+    SAMPLING_WINDOW_SECONDS: int = 60
+    SAMPLING_KEEP_PER_WINDOW: int = 10
+    SAMPLING_FLUSH_EVERY: int = 100
+
+    FACET_EXACT_LIMIT: int = 100_000
+    FACET_SAMPLE_SIZE: int = 10_000
+    COUNTER_FLUSH_EVERY: int = 500
+
     class Config:
         env_file = './.env'
 
@@ -3,7 +3,14 @@ Module for MongoDB connection and collection initialization.
 
 This module provides the necessary code for connecting to a MongoDB server,
 initializing the database and collections, and creating an index on the
-"email" field of the "users" collection.
+"email" field of the "users" collection and a unique sparse index on the
+"idempotency_key" field of the "logs" collection. The "created_at" field of
+the "logs" collection leads an index that serves time range scans and
+covers facet counts. The "status_code", "request_type", "client_ip",
+"host_id" and "url_id" fields each lead a similar index, which serves facet
+counts filtered on that field as well as URL and host lookups. The "url_grams" collection is indexed on its "gram"
+and "url_id" fields for substring search. The "cache_versions" collection
+holds the write versions shared by the result caches of every process.
 
 Dependencies:
     - mongo_client from pymongo: MongoClient class for connecting to a MongoDB
@@ -18,6 +25,12 @@ Variables:
     - db: The MongoDB database.
     - User: The "users" collection in the MongoDB database.
     - Log: The "logs" collection in the MongoDB database.
+    - UserSummary: The "user_summaries" collection in the MongoDB database.
+    - AnomalyScore: The "anomaly_scores" collection in the MongoDB database.
+    - Url: The "urls" collection in the MongoDB database.
+    - UrlGram: The "url_grams" collection in the MongoDB database.
+    - LogCounter: The "log_counters" collection in the MongoDB database.
+    - CacheVersion: The "cache_versions" collection in the MongoDB database.
 
 """
 
@@ -38,4 +51,33 @@ except Exception:  # pylint: disable=broad-except
 db = client[settings.MONGO_INITDB_DATABASE]
 User = db.users
 Log = db.logs
+UserSummary = db.user_summaries
+AnomalyScore = db.anomaly_scores
+Url = db.urls
+UrlGram = db.url_grams
+LogCounter = db.log_counters
+CacheVersion = db.cache_versions
 User.create_index([("email", pymongo.ASCENDING)], unique=True)
+Log.create_index([("idempotency_key", pymongo.ASCENDING)],
+                 unique=True, sparse=True)
+Log.create_index([("created_at", pymongo.ASCENDING),
+                  ("status_code", pymongo.ASCENDING),
+                  ("request_type", pymongo.ASCENDING),
+                  ("client_ip", pymongo.ASCENDING),
+                  ("count", pymongo.ASCENDING)])
+# Selective facet filters without a time range lead with their own field,
+# so they are bounded and covered too. The URL and host indexes also serve
+# URL and host lookups.
+for field in ("status_code", "request_type", "client_ip", "host_id",
+              "url_id"):
+    Log.create_index(
+        [(field, pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)] +
+        [(name, pymongo.ASCENDING)
+         for name in ("status_code", "request_type", "client_ip", "count")
+         if name != field])
+UrlGram.create_index([("gram", pymongo.ASCENDING),
+                      ("url_id", pymongo.ASCENDING)], unique=True)
+AnomalyScore.create_index([("kind", pymongo.ASCENDING),
+                           ("key", pymongo.ASCENDING),
+                           ("period_start", pymongo.ASCENDING),
+                           ("period_end", pymongo.ASCENDING)], unique=True)
@@ -0,0 +1,113 @@
+"""
+Module for cheap duplicate suppression of ingested logs.
+
+This module provides a time-rotating Bloom filter used to decide, without a
+database round trip, whether an idempotency key has possibly been seen
+before. A negative answer from the filter is definitive, so the common case
+(a key that was never ingested) never reads from MongoDB. A positive answer
+is only a hint and must be confirmed against the unique sparse index on
+`logs.idempotency_key`, which remains the authoritative backstop.
+
+Memory is bounded by keeping only two generations of the filter: the
+current window and the previous one. When the current window expires, the
+previous generation is dropped and a fresh one is started.
+
+Dependencies:
+    - hashlib: hashlib module for hashing keys.
+    - math: math module for sizing the filter.
+    - threading: threading module for guarding concurrent access.
+    - time: time module for measuring window expiry.
+    - datetime from datetime: datetime class for working with dates and times.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+
+Classes:
+    - BloomFilter: Fixed-size Bloom filter over string keys.
+    - RotatingBloomFilter: Two-generation Bloom filter rotated by time window.
+
+Functions:
+    - idempotency_key(user_id, request_type, url, status_code, timestamp,
+      client_key): Function to compute the idempotency key of a log.
+
+Attributes:
+    - seen_keys (RotatingBloomFilter): Process-wide filter of ingested keys.
+
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+
+from config import settings
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        bits = -capacity * math.log(error_rate) / (math.log(2) ** 2)
+        self.size = max(8, int(math.ceil(bits)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+
+class RotatingBloomFilter:
+    def __init__(self, capacity: int, error_rate: float, window: int):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.window = window
+        self.lock = threading.Lock()
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: BloomFilter | None = None
+        self.started = time.monotonic()
+
+    def _rotate(self):
+        if time.monotonic() - self.started >= self.window:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+            self.started = time.monotonic()
+
+    def add(self, key: str):
+        with self.lock:
+            self._rotate()
+            self.current.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            self._rotate()
+            if key in self.current:
+                return True
+            return self.previous is not None and key in self.previous
+
+
+def idempotency_key(user_id: str, request_type: str, url: str,
+                    status_code: int, timestamp: datetime | None = None,
+                    client_key: str | None = None) -> str | None:
+    if client_key:
+        material = f'key|{user_id}|{client_key}'
+    elif timestamp:
+        material = (f'hash|{user_id}|{request_type.upper()}|{url}|'
+                    f'{status_code}|{timestamp.isoformat()}')
+    else:
+        return None
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+seen_keys = RotatingBloomFilter(settings.IDEMPOTENCY_FILTER_CAPACITY,
+                                settings.IDEMPOTENCY_FILTER_ERROR_RATE,
+                                settings.IDEMPOTENCY_WINDOW_SECONDS)
@@ -0,0 +1,299 @@
+"""
+Module for result totals and facet counts of log queries.
+
+This module computes the total and the breakdown by status code, request
+type and client IP of the logs matching a filter, picking the cheapest
+strategy that is accurate enough and reporting whether each number is exact:
+
+    - selective filters: an index-bounded count first checks whether the
+      filter matches at most `FACET_EXACT_LIMIT` logs. If so, the counts are
+      computed exactly by a single aggregation whose projection only uses
+      fields of the (created_at, status_code, request_type, client_ip,
+      count) index. Filters on a status code, request type, client IP, host
+      or URL are served by indexes leading with that field and holding the
+      same fields, so with or without a time range they are covered.
+    - broad filters on time only (or no filter at all): the total and the
+      status code and request type breakdowns are read from hourly counters
+      maintained at ingest, which costs one small document per hour of the
+      range.
+    - other broad filters, and the client IP breakdown of broad filters: a
+      random sample of the collection is filtered and scaled up to the
+      estimated size of the collection. Since such filters are known to
+      match more than `FACET_EXACT_LIMIT` logs, estimated totals are never
+      reported below that.
+
+Counts are weighted by the `count` of aggregate documents, so they count
+logged events rather than stored documents. Hourly counters are buffered in
+memory and flushed every few events, before being read, and on shutdown. A
+flush that fails puts its counts back in the buffer for the next one and
+never fails the ingest that triggered it. Values that are not valid field
+names, such as an empty request type, are counted under a placeholder key.
+
+Like the exact counts, hourly counters only cover logs stored in MongoDB:
+the archive job subtracts the logs it moves out. Counters of logs written
+before they existed, or that drifted, are rebuilt from the logs themselves
+by the backfill job, which replaces the counters of every hour before the
+current one.
+
+Usage:
+    python facets.py
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - threading: threading module for guarding concurrent access.
+    - Counter from collections: Counter class for buffering counts.
+    - datetime from datetime: datetime class for working with dates and times.
+    - ReplaceOne from pymongo: ReplaceOne class for bulk writes.
+    - PyMongoError from pymongo.errors: Base class of MongoDB errors.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+    - Log from app.database: Log collection from the MongoDB database.
+    - LogCounter from app.database: LogCounter collection from the MongoDB
+      database.
+
+Classes:
+    - TimeBucketCounters: Buffered hourly counters of ingested logs.
+
+Functions:
+    - discount_logs(logs): Function to subtract logs leaving MongoDB from
+      the hourly counters.
+    - facet_counts(filter_query, start, end, top): Function to compute the
+      total and facet counts of a filter.
+    - backfill(until): Function to rebuild the hourly counters from the
+      logs stored before a given hour.
+    - main(): Command line entry point.
+
+Attributes:
+    - FACET_FIELDS (tuple): Fields broken down by the facet counts.
+    - counters (TimeBucketCounters): Process-wide hourly counters.
+
+"""
+
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime
+
+from pymongo import ReplaceOne
+from pymongo.errors import PyMongoError
+
+from config import settings
+from database import Log, LogCounter
+
+FACET_FIELDS = ('status_code', 'request_type', 'client_ip')
+COUNTED_FIELDS = ('status_code', 'request_type')
+WEIGHT = {'$ifNull': ['$count', 1]}
+EMPTY_KEY = '(empty)'
+
+
+def _counter_key(value) -> str:
+    # Field names may not be empty nor contain dots, dollars or nulls.
+    key = str(value).replace('.', '_').replace('$', '_').replace('\0', '_')
+    return key or EMPTY_KEY
+
+
+def _hour(created_at: datetime) -> datetime:
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+def _tally(pending: dict, document: dict, count: int):
+    counts = pending.setdefault(_hour(document['created_at']), Counter())
+    counts['total'] += count
+    for field in COUNTED_FIELDS:
+        counts[f'{field}.{_counter_key(document.get(field))}'] += count
+
+
+def _write_counts(pending: dict) -> dict:
+    failed = {}
+    for hour, counts in pending.items():
+        try:
+            LogCounter.update_one({'_id': hour}, {'$inc': dict(counts)},
+                                  upsert=True)
+        except PyMongoError as error:
+            print(f'Unable to update the log counters of {hour}: {error}')
+            failed[hour] = counts
+    return failed
+
+
+class TimeBucketCounters:
+    def __init__(self, flush_every: int):
+        self.flush_every = flush_every
+        self.pending: dict[datetime, Counter] = {}
+        self.buffered = 0
+        self.lock = threading.Lock()
+
+    def _take(self) -> dict:
+        pending = self.pending
+        self.pending = {}
+        self.buffered = 0
+        return pending
+
+    def _write(self, pending: dict):
+        # Written outside the lock; failed buckets go back to the buffer.
+        failed = _write_counts(pending)
+        if failed:
+            with self.lock:
+                for hour, counts in failed.items():
+                    self.pending.setdefault(hour, Counter()).update(counts)
+                    self.buffered += counts['total']
+
+    def add(self, document: dict, count: int = 1):
+        pending = None
+        with self.lock:
+            _tally(self.pending, document, count)
+            self.buffered += count
+            if self.buffered >= self.flush_every:
+                pending = self._take()
+        if pending:
+            self._write(pending)
+
+    def flush(self):
+        with self.lock:
+            pending = self._take()
+        self._write(pending)
+
+
+def discount_logs(logs: list):
+    pending: dict = {}
+    for log in logs:
+        _tally(pending, log, -(log.get('count') or 1))
+    _write_counts(pending)
+
+
+def _facet_pipeline(fields: tuple, top: int) -> list:
+    return [
+        {'$project': {'_id': 0, 'count': 1,
+                      **{field: 1 for field in fields}}},
+        {'$facet': {
+            'total': [{'$group': {'_id': None, 'count': {'$sum': WEIGHT}}}],
+            **{field: [{'$group': {'_id': f'${field}',
+                                   'count': {'$sum': WEIGHT}}},
+                       {'$sort': {'count': -1}},
+                       {'$limit': top}]
+               for field in fields}
+        }}
+    ]
+
+
+def _facet(field: str, rows: list, exact: bool, scale: float = 1) -> dict:
+    return {
+        'field': field,
+        'exact': exact,
+        'values': [{'value': row['_id'], 'count': round(row['count'] * scale)}
+                   for row in rows]
+    }
+
+
+def _aggregate(pipeline: list, fields: tuple, exact: bool,
+               scale: float = 1) -> tuple[int, list]:
+    result = next(Log.aggregate(pipeline), {})
+    total = result.get('total') or [{'count': 0}]
+    return (round(total[0]['count'] * scale),
+            [_facet(field, result.get(field, []), exact, scale)
+             for field in fields])
+
+
+def _sampled(filter_query: dict, fields: tuple,
+             top: int) -> tuple[int, list]:
+    estimated = Log.estimated_document_count()
+    size = min(settings.FACET_SAMPLE_SIZE, estimated) or 1
+    pipeline = [{'$sample': {'size': size}}, {'$match': filter_query},
+                *_facet_pipeline(fields, top)]
+    return _aggregate(pipeline, fields, False, estimated / size)
+
+
+def _bucketed(start: datetime | None, end: datetime | None,
+              top: int) -> tuple[int, list]:
+    counters.flush()
+    query: dict = {}
+    if start:
+        query['$gte'] = start.replace(minute=0, second=0, microsecond=0)
+    if end:
+        query['$lt'] = end
+    total = 0
+    values = {field: Counter() for field in COUNTED_FIELDS}
+    for bucket in LogCounter.find({'_id': query} if query else {}):
+        total += bucket.get('total', 0)
+        for field in COUNTED_FIELDS:
+            values[field].update(bucket.get(field, {}))
+    facets = []
+    for field in COUNTED_FIELDS:
+        rows = [{'_id': int(value) if field == 'status_code' else value,
+                 'count': count}
+                for value, count in values[field].most_common()
+                if count > 0][:top]
+        facets.append(_facet(field, rows, False))
+    return total, facets
+
+
+def facet_counts(filter_query: dict, start: datetime | None,
+                 end: datetime | None, top: int) -> dict:
+    if start or end:
+        filter_query = dict(filter_query)
+        filter_query['created_at'] = {
+            **({'$gte': start} if start else {}),
+            **({'$lt': end} if end else {})}
+    matched = Log.count_documents(filter_query,
+                                  limit=settings.FACET_EXACT_LIMIT + 1)
+    if matched <= settings.FACET_EXACT_LIMIT:
+        total, facets = _aggregate(
+            [{'$match': filter_query}, *_facet_pipeline(FACET_FIELDS, top)],
+            FACET_FIELDS, True)
+        return {'total': total, 'total_exact': True, 'facets': facets}
+
+    # The count above already showed that more logs match than that.
+    floor = settings.FACET_EXACT_LIMIT + 1
+    if set(filter_query) <= {'created_at'}:
+        total, facets = _bucketed(start, end, top)
+        _, ip_facets = _sampled(filter_query, ('client_ip',), top)
+        return {'total': max(total, floor), 'total_exact': False,
+                'facets': facets + ip_facets}
+
+    total, facets = _sampled(filter_query, FACET_FIELDS, top)
+    return {'total': max(total, floor), 'total_exact': False,
+            'facets': facets}
+
+
+def backfill(until: datetime) -> int:
+    pipeline = [
+        {'$match': {'created_at': {'$lt': until}}},
+        {'$group': {
+            '_id': {'hour': {'$dateTrunc': {'date': '$created_at',
+                                            'unit': 'hour'}},
+                    **{field: f'${field}' for field in COUNTED_FIELDS}},
+            'count': {'$sum': WEIGHT}}}
+    ]
+    buckets: dict = {}
+    for row in Log.aggregate(pipeline, allowDiskUse=True):
+        counts = buckets.setdefault(row['_id']['hour'], {'total': 0})
+        counts['total'] += row['count']
+        for field in COUNTED_FIELDS:
+            values = counts.setdefault(field, {})
+            key = _counter_key(row['_id'].get(field))
+            values[key] = values.get(key, 0) + row['count']
+    if buckets:
+        LogCounter.bulk_write([
+            ReplaceOne({'_id': hour}, counts, upsert=True)
+            for hour, counts in buckets.items()], ordered=False)
+    # Hours left without logs, for example once archived, count nothing.
+    LogCounter.delete_many({'_id': {'$lt': until, '$nin': list(buckets)}})
+    return len(buckets)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rebuild the hourly log counters from stored logs.')
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        default=_hour(datetime.utcnow()),
+                        help='Hour up to which counters are rebuilt '
+                             '(default: the current hour).')
+    args = parser.parse_args()
+    rebuilt = backfill(_hour(args.until))
+    print(f'Rebuilt the counters of {rebuilt} hours')
+
+
+counters = TimeBucketCounters(settings.COUNTER_FLUSH_EVERY)
+
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,15 @@ Dependencies:
     - auth from app.routers: Module for authentication-related routes.
     - user from app.routers: Module for user-related routes.
     - log from app.routers: Module for log-related routes.
+    - admin from app.routers: Module for admin-related routes.
+    - ProfilingMiddleware from app.profiling: ASGI middleware for per-request
+      profiling.
+    - profiling_enabled from app.profiling: Function for checking whether
+      profiling is configured.
+    - sampler from app.sampling: Sampler collapsing repeated logs, flushed on
+      shutdown.
+    - counters from app.facets: Hourly counters of ingested logs, flushed on
+      shutdown.
 
 Routes:
     - GET '/api/healthchecker': Endpoint for checking the health of the
@@ -24,7 +33,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import settings
-from routers import auth, log, user
+from facets import counters
+from profiling import ProfilingMiddleware, profiling_enabled
+from routers import admin, auth, log, user
+from sampling import sampler
 
 app = FastAPI()
 
@@ -40,10 +52,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if profiling_enabled():
+    app.add_middleware(ProfilingMiddleware)
+
 
 app.include_router(auth.router, tags=['Auth'], prefix='/api/auth')
 app.include_router(user.router, tags=['Users'], prefix='/api/users')
 app.include_router(log.router, tags=['Logs'], prefix="/api/logs")
+app.include_router(admin.router, tags=['Admin'], prefix='/api/admin')
+
+
+@app.on_event("shutdown")
+def flush_buffers():
+    sampler.flush_all()
+    counters.flush()
 
 
 @app.get("/api/healthchecker")
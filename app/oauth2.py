@@ -25,9 +25,13 @@ Exceptions:
 
 Functions:
     - get_config(): Function to load JWT configuration settings.
+    - require_user_document(): Function to require authentication and
+      authorization for a user, returning the user document.
     - require_user(): Function to require authentication and authorization for
       a user.
     - get_current_user(): Function to retrieve the current authenticated user.
+    - require_admin(): Function to require authentication and the admin role
+      for a user.
 
 """
 
@@ -70,11 +74,12 @@ class UserNotFound(Exception):
     pass
 
 
-def require_user(authorize: AuthJWT = Depends()):
+def require_user_document(authorize: AuthJWT = Depends()):
     try:
         authorize.jwt_required()
         user_id = authorize.get_jwt_subject()
-        user = userEntity(User.find_one({'_id': ObjectId(str(user_id))}))
+        db_user = User.find_one({'_id': ObjectId(str(user_id))})
+        user = userEntity(db_user)
 
         if not user:
             raise UserNotFound('User no longer exist')
@@ -100,7 +105,11 @@ def require_user(authorize: AuthJWT = Depends()):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail='Token is invalid or has expired') from err
-    return user_id
+    return db_user
+
+
+def require_user(db_user: dict = Depends(require_user_document)):
+    return str(db_user['_id'])
 
 
 def get_current_user(authorize: AuthJWT = Depends()):
@@ -112,3 +121,12 @@ def get_current_user(authorize: AuthJWT = Depends()):
         raise HTTPException(
             status_code=401,
             detail="Access token is not valid. Please log in again.") from err
+
+
+def require_admin(user_id: str = Depends(require_user)):
+    user = User.find_one({'_id': ObjectId(str(user_id))})
+    if not user or user.get('role') != 'admin':
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Admin privileges required')
+    return user_id
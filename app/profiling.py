@@ -0,0 +1,209 @@
+"""
+Module for opt-in per-request profiling.
+
+This module provides an ASGI middleware that profiles selected requests with
+a stack sampling profiler. A request is profiled when it carries the
+`X-Profile` header set to the configured token, or when it is picked by the
+random sampling rate. While the request runs, a background thread samples
+the stacks of the event loop and of the thread pool, so time spent in
+either (authentication, bcrypt, Pydantic validation, MongoDB calls) is
+captured alike. The event loop is only sampled while the task of the
+profiled request is the one running on it, and of the other threads only
+AnyIO pool workers running a call are sampled, recognized by their worker
+loop frame; idle workers and background threads (such as the MongoDB
+driver's monitors) are left out. Busy pool workers cannot be told apart by
+request, so when other requests run concurrently, their thread pool work
+can show up in the profile; profiles are most accurate on a quiet instance
+or with a single profiled request in flight, which the middleware enforces.
+
+Profiles of requests slower than the threshold, and of every explicitly
+requested profile, are written as collapsed stacks (one `frame;frame;frame
+count` line per call path, the format read by flame graph tools) to a
+directory that is kept to a bounded number of files, oldest first out.
+Stopping the sampler and writing the profile run in the thread pool, off
+the event loop.
+
+The middleware is only installed when profiling is enabled, so there is no
+overhead at all otherwise.
+
+Dependencies:
+    - asyncio: asyncio module for identifying the task of a request.
+    - os: os module for working with file paths.
+    - random: random module for sampling requests.
+    - re: re module for building file names.
+    - sys: sys module for reading thread stacks.
+    - threading: threading module for the sampling thread.
+    - time: time module for measuring request duration.
+    - Counter from collections: Counter class for counting stacks.
+    - datetime from datetime: datetime class for working with dates and times.
+    - run_in_threadpool from starlette.concurrency: run_in_threadpool
+      function for running blocking work off the event loop.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+
+Classes:
+    - StackSampler (threading.Thread): Thread sampling the stacks serving a
+      request.
+    - ProfilingMiddleware: ASGI middleware profiling selected requests.
+
+Functions:
+    - profiling_enabled(): Function to check whether profiling is configured.
+    - list_profiles(): Function to list the stored profiles.
+    - profile_path(name): Function to resolve the path of a stored profile.
+
+"""
+
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+
+from config import settings
+
+SAMPLE_INTERVAL = 0.002
+PROFILE_HEADER = b'x-profile'
+
+
+def _frames(frame) -> list:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _worker_busy(frames: list) -> bool:
+    # Pool threads are AnyIO workers: their `run` loop either waits for
+    # work on its queue, or runs a call of a request right above it.
+    for depth, frame in enumerate(frames[:-1]):
+        code = frame.f_code
+        if code.co_name == 'run' and 'anyio' in code.co_filename:
+            call = frames[depth + 1].f_code
+            return not (call.co_name == 'get' and
+                        os.path.basename(call.co_filename) == 'queue.py')
+    return False
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task):
+        super().__init__(daemon=True)
+        self.loop = loop
+        self.task = task
+        self.loop_thread = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.stopped = threading.Event()
+
+    def _sampled(self, thread_id: int, frames: list) -> bool:
+        if thread_id == self.loop_thread:
+            return asyncio.current_task(self.loop) is self.task
+        return _worker_busy(frames)
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            # pylint: disable-next=protected-access
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                frames = _frames(frame)
+                if not self._sampled(thread_id, frames):
+                    continue
+                self.stacks[';'.join(
+                    f'{frame.f_code.co_name} '
+                    f'({os.path.basename(frame.f_code.co_filename)}:'
+                    f'{frame.f_lineno})' for frame in frames)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def profiling_enabled() -> bool:
+    return settings.PROFILE_SAMPLE_RATE > 0 or bool(settings.PROFILE_TOKEN)
+
+
+def list_profiles() -> list:
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    profiles = []
+    for entry in os.scandir(settings.PROFILE_DIR):
+        if entry.is_file() and entry.name.endswith('.folded'):
+            stat = entry.stat()
+            profiles.append({
+                'name': entry.name,
+                'size': stat.st_size,
+                'created_at': datetime.utcfromtimestamp(stat.st_mtime)
+            })
+    return sorted(profiles, key=lambda profile: profile['created_at'],
+                  reverse=True)
+
+
+def profile_path(name: str) -> str | None:
+    if name not in {profile['name'] for profile in list_profiles()}:
+        return None
+    return os.path.join(settings.PROFILE_DIR, name)
+
+
+def _save_profile(scope, elapsed_ms: int, stacks: Counter):
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = re.sub(r'[^A-Za-z0-9]+', '_', scope['path']).strip('_')
+    name = (f'{datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")}-'
+            f'{scope["method"]}-{path or "root"}-{elapsed_ms}ms.folded')
+    with open(os.path.join(settings.PROFILE_DIR, name), 'w',
+              encoding='utf-8') as file:
+        for stack, count in stacks.most_common():
+            file.write(f'{stack} {count}\n')
+    for profile in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        os.remove(os.path.join(settings.PROFILE_DIR, profile['name']))
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.token = (settings.PROFILE_TOKEN or '').encode('latin-1')
+
+    def _requested(self, scope) -> bool:
+        if not self.token:
+            return False
+        return any(key == PROFILE_HEADER and value == self.token
+                   for key, value in scope['headers'])
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        requested = self._requested(scope)
+        sampled = random.random() < settings.PROFILE_SAMPLE_RATE
+        # A single sampler at a time keeps the pool threads of two profiled
+        # requests from mixing.
+        if not (requested or sampled) or not self.lock.acquire(
+                blocking=False):
+            await self.app(scope, receive, send)
+            return
+        sampler = StackSampler(asyncio.get_running_loop(),
+                               asyncio.current_task())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+            await run_in_threadpool(self._finish, sampler, scope, elapsed_ms,
+                                    requested)
+
+    def _finish(self, sampler: StackSampler, scope, elapsed_ms: int,
+                requested: bool):
+        try:
+            sampler.stop()
+        finally:
+            self.lock.release()
+        if requested or elapsed_ms >= settings.PROFILE_SLOW_MS:
+            _save_profile(scope, elapsed_ms, sampler.stacks)
@@ -0,0 +1,66 @@
+"""
+Module for the lean log ingest record.
+
+This module defines `LogRecord`, a compact `__slots__` record used on the
+ingest path instead of round-tripping through Pydantic models. A record is
+built once from the validated request payload, produces the stored document
+once, and produces the response from its own fields after the write, so
+ingesting a log never re-reads the document it has just stored nor
+validates the response again.
+
+Dependencies:
+    - datetime from datetime: datetime class for working with dates and times.
+
+Classes:
+    - LogRecord: Compact record of an ingested log.
+
+"""
+
+from datetime import datetime
+
+
+class LogRecord:
+    __slots__ = ('request_type', 'url', 'url_id', 'host_id', 'client_ip',
+                 'status_code', 'created_at', 'user', 'document')
+
+    def __init__(self, request_type: str, url: str, url_id: int,
+                 host_id: int, client_ip: str | None, status_code: int,
+                 user: dict, created_at: datetime | None = None):
+        self.request_type = request_type
+        self.url = url
+        self.url_id = url_id
+        self.host_id = host_id
+        self.client_ip = client_ip
+        self.status_code = status_code
+        self.created_at = created_at or datetime.utcnow()
+        self.user = user
+        self.document: dict | None = None
+
+    def to_document(self) -> dict:
+        self.document = {
+            "request_type": self.request_type,
+            "client_ip": self.client_ip,
+            "status_code": self.status_code,
+            "created_at": self.created_at,
+            "updated_at": self.created_at,
+            "user": self.user,
+            "url_id": self.url_id,
+            "host_id": self.host_id
+        }
+        return self.document
+
+    def to_response(self) -> dict:
+        document = self.document or {}
+        return {
+            "id": str(document["_id"]),
+            "created_at": self.created_at,
+            "updated_at": self.created_at,
+            "request_type": self.request_type,
+            "url": self.url,
+            "client_ip": self.client_ip,
+            "status_code": self.status_code,
+            "user": self.user,
+            "count": document.get("count", 1),
+            "first_seen": document.get("first_seen"),
+            "last_seen": document.get("last_seen")
+        }
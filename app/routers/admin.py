@@ -0,0 +1,54 @@
+"""
+Module for defining admin-related API routes.
+
+This module defines the API routes for operating the application, available
+only to users with the admin role.
+
+Dependencies:
+    - APIRouter from fastapi: APIRouter class for defining API routes.
+    - Depends from fastapi: Depends class for defining dependencies.
+    - HTTPException from fastapi: HTTPException class for raising HTTP
+      exceptions.
+    - status from fastapi: status module for defining HTTP status codes.
+    - FileResponse from fastapi.responses: FileResponse class for sending
+      files.
+    - schemas from app: Module for defining schemas.
+    - require_admin from app.oauth2: Function for requiring a user to be an
+      authenticated admin.
+    - list_profiles from app.profiling: Function for listing stored request
+      profiles.
+    - profile_path from app.profiling: Function for resolving the path of a
+      stored request profile.
+
+Attributes:
+    - router (APIRouter): APIRouter instance for defining admin-related API
+      routes.
+
+API Routes:
+    - GET /profiles: Route for listing stored request profiles.
+    - GET /profiles/{name}: Route for downloading a stored request profile.
+
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+
+import schemas
+from oauth2 import require_admin
+from profiling import list_profiles, profile_path
+
+router = APIRouter()
+
+
+@router.get('/profiles', response_model=schemas.ProfilesResponse)
+def get_profiles(_: str = Depends(require_admin)):
+    return {"status": "success", "profiles": list_profiles()}
+
+
+@router.get('/profiles/{name}')
+def download_profile(name: str, _: str = Depends(require_admin)):
+    path = profile_path(name)
+    if not path:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail='Profile not found')
+    return FileResponse(path, media_type='text/plain', filename=name)
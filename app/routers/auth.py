@@ -21,11 +21,19 @@ Dependencies:
       a user document to a dictionary.
     - userResponseEntity from app.serializers.userSerializers: Function for
       converting a user document to a dictionary for a response.
+    - logUserEntity from app.serializers.userSerializers: Function for
+      converting a user document to the user embedded in a log.
     - schemas from app: Module for defining schemas.
     - utils from app: Module for defining utility functions.
     - AuthJWT from app.oauth2: AuthJWT class for managing JWT authentication.
     - settings from app.config: settings module for accessing application
       configuration.
+    - record_activity from app.summaries: Function for updating the activity
+      summary of a user.
+    - compact_url from app.urls: Function for storing the URL of a log in the
+      shared URL table.
+    - log_cache from app.cache: Result cache of log listings.
+    - counters from app.facets: Hourly counters of ingested logs.
 
 Attributes:
     - router (APIRouter): APIRouter instance for defining
@@ -48,18 +56,37 @@ from datetime import datetime, timedelta
 import schemas
 import utils
 from bson.objectid import ObjectId
+from cache import log_cache
 from config import settings
 from database import Log, User
+from facets import counters
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from oauth2 import AuthJWT
 from pydantic import EmailStr
-from serializers.userSerializers import userEntity, userResponseEntity
+from serializers.userSerializers import (logUserEntity, userEntity,
+                                         userResponseEntity)
+from summaries import record_activity
+from urls import compact_url
 
 router = APIRouter()
 ACCESS_TOKEN_EXPIRES_IN = settings.ACCESS_TOKEN_EXPIRES_IN
 REFRESH_TOKEN_EXPIRES_IN = settings.REFRESH_TOKEN_EXPIRES_IN
 
 
+def _write_log(new_log: schemas.LogSchema):
+    document = compact_url(new_log.dict())
+    if new_log.user:
+        # Embed the same public fields as the logs written by the API, never
+        # the password hash.
+        document['user'] = logUserEntity(new_log.user)
+    Log.insert_one(document)
+    counters.add(document)
+    log_cache.bump()
+    if new_log.user:
+        record_activity(str(new_log.user['_id']), new_log.status_code,
+                        new_log.client_ip, new_log.created_at)
+
+
 @router.post('/register', status_code=status.HTTP_201_CREATED,
              response_model=schemas.UserResponse)
 async def create_user(payload: schemas.CreateUserSchema,
@@ -80,13 +107,13 @@ async def create_user(payload: schemas.CreateUserSchema,
     if user:
         new_log.user = user
         new_log.status_code = status.HTTP_409_CONFLICT
-        Log.insert_one(new_log.dict())
+        _write_log(new_log)
         raise HTTPException(status_code=new_log.status_code,
                             detail='Account already exist')
     # Compare password and passwordConfirm
     if payload.password != payload.passwordConfirm:
         new_log.status_code = status.HTTP_400_BAD_REQUEST
-        Log.insert_one(new_log.dict())
+        _write_log(new_log)
         raise HTTPException(
             status_code=new_log.status_code,
             detail='Passwords do not match')
@@ -100,7 +127,7 @@ async def create_user(payload: schemas.CreateUserSchema,
     payload.updated_at = payload.created_at
     result = User.insert_one(payload.dict())
     new_user = userResponseEntity(User.find_one({'_id': result.inserted_id}))
-    Log.insert_one(new_log.dict())
+    _write_log(new_log)
     return {"status": "success", "user": new_user}
 
 
@@ -128,7 +155,7 @@ def login(
 
     if not db_user:
         new_log.status_code = status.HTTP_400_BAD_REQUEST
-        Log.insert_one(new_log.dict())
+        _write_log(new_log)
         raise HTTPException(status_code=new_log.status_code,
                             detail='Incorrect Email or Password')
 
@@ -137,7 +164,7 @@ def login(
 
     if not utils.verify_password(payload.password, user['password']):
         new_log.status_code = status.HTTP_400_BAD_REQUEST
-        Log.insert_one(new_log.dict())
+        _write_log(new_log)
         raise HTTPException(status_code=new_log.status_code,
                             detail='Incorrect Email or Password')
 
@@ -162,7 +189,7 @@ def login(
         'logged_in', 'True', ACCESS_TOKEN_EXPIRES_IN * 60,
         ACCESS_TOKEN_EXPIRES_IN * 60, '/', None, False, False, 'lax')
 
-    Log.insert_one(new_log.dict())
+    _write_log(new_log)
 
     return {'status': 'success', 'access_token': access_token}
 
@@ -186,14 +213,14 @@ def refresh_token(request: Request, response: Response,
         user_id = authorize.get_jwt_subject()
         if not user_id:
             new_log.status_code = status.HTTP_401_UNAUTHORIZED
-            Log.insert_one(new_log.dict())
+            _write_log(new_log)
             raise HTTPException(status_code=new_log.status_code,
                                 detail='Could not refresh access token')
         db_user = User.find_one({'_id': ObjectId(str(user_id))})
         user = userEntity(db_user)
         if not user:
             new_log.status_code = status.HTTP_401_UNAUTHORIZED
-            Log.insert_one(new_log.dict())
+            _write_log(new_log)
             raise HTTPException(
                 status_code=new_log.status_code,
                 detail='The user belonging to this token no logger exist')
@@ -205,12 +232,12 @@ def refresh_token(request: Request, response: Response,
         error = err.__class__.__name__
         if error == 'MissingTokenError':
             new_log.status_code = status.HTTP_400_BAD_REQUEST
-            Log.insert_one(new_log.dict())
+            _write_log(new_log)
             raise HTTPException(
                 status_code=new_log.status_code,
                 detail='Please provide refresh token') from err
         new_log.status_code = status.HTTP_400_BAD_REQUEST
-        Log.insert_one(new_log.dict())
+        _write_log(new_log)
         raise HTTPException(
             status_code=new_log.status_code,
             detail=error) from err
@@ -221,7 +248,7 @@ def refresh_token(request: Request, response: Response,
     response.set_cookie(
         'logged_in', 'True', ACCESS_TOKEN_EXPIRES_IN * 60,
         ACCESS_TOKEN_EXPIRES_IN * 60, '/', None, False, False, 'lax')
-    Log.insert_one(new_log.dict())
+    _write_log(new_log)
     return {'access_token': access_token}
 
 
@@ -244,7 +271,7 @@ def logout(request: Request, response: Response,
         db_user = User.find_one({'_id': ObjectId(str(user_id))})
         if db_user:
             new_log.user = db_user
-    Log.insert_one(new_log.dict())
+    _write_log(new_log)
     authorize.unset_jwt_cookies()
     response.set_cookie('logged_in', '', -1)
     return {'status': 'success'}
@@ -15,17 +15,44 @@ Dependencies:
     - schemas from app: Module for defining data schemas.
     - Log from app.database: Log class for interacting with the log
       collection in the database.
-    - User from app.database: User class for interacting with the user
-      collection in the database.
-    - LogSchema from app.schemas: LogSchema class for validating log data.
+    - LogRecord from app.records: LogRecord class for building ingested log
+      data.
     - logResponseEntity from app.serializers.logSerializers: logResponseEntity
       class for serializing log data.
     - get_current_user from app.utils: get_current_user function for
       retrieving the current user.
+    - idempotency_key from app.dedup: idempotency_key function for computing
+      the duplicate suppression key of a log.
+    - seen_keys from app.dedup: seen_keys filter of recently ingested keys.
+    - ARCHIVE_SCHEMA from app.archive: ARCHIVE_SCHEMA schema of the archived
+      log columns.
+    - scan_archive from app.archive: scan_archive function for reading
+      archived logs.
+    - record_activity from app.summaries: record_activity function for
+      updating the activity summary of a user.
+    - intern_url from app.urls: intern_url function for storing the URL of a
+      log in the shared URL table.
+    - host_id from app.urls: host_id function for computing the id of a host.
+    - url_id from app.urls: url_id function for computing the id of a URL.
+    - find_url_ids from app.search: find_url_ids function for searching URLs
+      by substring.
+    - log_cache from app.cache: log_cache result cache of log listings.
+    - sampler from app.sampling: sampler collapsing repeated logs into
+      aggregates.
+    - counters from app.facets: counters of ingested logs per hour.
+    - facet_counts from app.facets: facet_counts function for computing log
+      totals and facet counts.
+    - logUserEntity from app.serializers.userSerializers: logUserEntity
+      function for serializing the user embedded in a log.
+    - require_user_document from app.oauth2: require_user_document function
+      for retrieving the authenticated user.
 
 Routes:
     - POST '/': Endpoint for creating a log.
-    - GET '/': Endpoint for retrieving logs.
+    - GET '/': Endpoint for retrieving logs. Responses carry an ETag and are
+      served from the result cache until the next log write.
+    - GET '/history': Endpoint for retrieving archived logs.
+    - GET '/facets': Endpoint for retrieving log totals and facet counts.
 
 """
 
@@ -33,12 +60,26 @@ from datetime import datetime
 from typing import Optional
 
 import schemas
+from archive import ARCHIVE_SCHEMA, scan_archive
 from bson import ObjectId
-from database import Log, User
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from oauth2 import require_user
-from schemas import CreateLogSchema, UserResponseSchema
-from serializers.logSerializers import logResponseEntity
+from cache import log_cache
+from database import Log
+from dedup import idempotency_key, seen_keys
+from facets import counters, facet_counts
+from fastapi import (APIRouter, Depends, Header, HTTPException, Request,
+                     Response, status)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from oauth2 import require_user_document
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from sampling import sampler
+from records import LogRecord
+from schemas import CreateLogSchema
+from search import find_url_ids
+from serializers.logSerializers import logResponseEntity, resolveLogUrls
+from serializers.userSerializers import logUserEntity
+from summaries import record_activity
+from urls import host_id, intern_url, url_id
 from utils import get_current_user
 
 router = APIRouter()
@@ -48,46 +89,91 @@ router = APIRouter()
              status_code=status.HTTP_201_CREATED)
 async def create_log(payload: CreateLogSchema,
                      request: Request,
-                     user_id: str = Depends(require_user)):
-    new_log = schemas.LogSchema(
+                     db_user: dict = Depends(require_user_document),
+                     idempotency_header: Optional[str] = Header(
+                         None, alias='Idempotency-Key')):
+    user_id = str(db_user["_id"])
+    new_url_id, new_host_id, url = intern_url(payload.url)
+    record = LogRecord(
         request_type=payload.request_type,
-        url=payload.url,
-        client_ip=None,
+        url=url,
+        url_id=new_url_id,
+        host_id=new_host_id,
+        client_ip=request.client.host if request.client else None,
         status_code=payload.status_code,
-        user=None,
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
-    )
-    if request.client:
-        new_log.client_ip = request.client.host
-    db_user = User.find_one({'_id': ObjectId(user_id)})
-    if not db_user:
-        Log.insert_one(new_log.dict())
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not authorized")
-    new_log.user = UserResponseSchema(
-        id=str(db_user["_id"]),
-        name=db_user["name"],
-        email=db_user["email"],
-        photo=db_user["photo"],
-        role=db_user["role"],
-        created_at=db_user["created_at"],
-        updated_at=db_user["updated_at"]
+        user=logUserEntity(db_user)
     )
-    result = Log.insert_one(new_log.dict())
-    response_log = logResponseEntity(Log.find_one({'_id': result.inserted_id}))
-    return {"status": "success", "log": response_log}
+    document = record.to_document()
+    key = idempotency_key(user_id, payload.request_type, payload.url,
+                          payload.status_code, payload.timestamp,
+                          payload.idempotency_key or idempotency_header)
+    if key:
+        # The filter never misses a key it has seen, so only a positive
+        # answer needs to be confirmed against the unique index.
+        if key in seen_keys:
+            existing = Log.find_one({'idempotency_key': key})
+            if existing:
+                return {"status": "success",
+                        "log": logResponseEntity(existing)}
+        document['idempotency_key'] = key
+    aggregate = sampler.observe(document)
+    if aggregate is not None:
+        if key:
+            seen_keys.add(key)
+        return {"status": "success", "log": logResponseEntity(aggregate)}
+    try:
+        Log.insert_one(document)
+    except DuplicateKeyError:
+        sampler.discard(document)
+        seen_keys.add(key)
+        existing = Log.find_one({'idempotency_key': key})
+        return {"status": "success", "log": logResponseEntity(existing)}
+    except PyMongoError:
+        sampler.discard(document)
+        raise
+    counters.add(document)
+    log_cache.bump()
+    if key:
+        seen_keys.add(key)
+    record_activity(user_id, record.status_code, record.client_ip,
+                    record.created_at)
+    # The record already holds everything the response needs, and it is
+    # valid by construction, so it is encoded as is.
+    return ORJSONResponse(status_code=status.HTTP_201_CREATED,
+                          content={"status": "success",
+                                   "log": record.to_response()})
 
 
 @router.get('', response_model=schemas.LogsResponse,
             status_code=status.HTTP_200_OK)
 async def get_logs(
     userID: Optional[str] = None,
+    host: Optional[str] = None,
+    url: Optional[str] = None,
+    q: Optional[str] = None,
     order_by: Optional[str] = "created_at",
     ascending: Optional[bool] = False,
-    current_user=Depends(get_current_user)
+    current_user=Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not logged in"
+        )
+
+    etag = log_cache.etag(userID=userID, host=host, url=url, q=q,
+                          order_by=order_by, ascending=ascending)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [
+            tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                        headers=headers)
+    body = log_cache.get(etag)
+    if body is not None:
+        return Response(content=body, media_type="application/json",
+                        headers=headers)
+
     sort_option = [(order_by, 1 if ascending else -1)]
 
     filter_query = {}
@@ -95,15 +181,112 @@ async def get_logs(
     if userID:
         filter_query["userID"] = ObjectId(userID)
 
+    if host:
+        filter_query["host_id"] = host_id(host)
+
+    if url:
+        filter_query["url_id"] = url_id(url)
+
+    if q:
+        url_ids = find_url_ids(q)
+        if "url_id" in filter_query:
+            url_ids = [key for key in url_ids
+                       if key == filter_query["url_id"]]
+        filter_query["url_id"] = {"$in": url_ids}
+
+    logs = resolveLogUrls(
+        list(Log.find(filter_query).sort(sort_option)))  # type: ignore
+
+    for log in logs:
+        # Logs written before the user was embedded by its response fields
+        # carry the whole user document.
+        user = log.get('user')
+        if user and 'id' not in user:
+            log['user'] = logUserEntity(user)
+    logs = [logResponseEntity(log) for log in logs]
+
+    body = JSONResponse(content=jsonable_encoder(
+        schemas.LogsResponse(status="success", logs=logs))).body
+    log_cache.put(etag, body)
+    return Response(content=body, media_type="application/json",
+                    headers=headers)
+
+
+@router.get('/history', response_model=schemas.ArchivedLogsResponse,
+            response_model_exclude_unset=True,
+            status_code=status.HTTP_200_OK)
+def get_archived_logs(
+    start: datetime,
+    end: datetime,
+    userID: Optional[str] = None,
+    request_type: Optional[str] = None,
+    status_code: Optional[int] = None,
+    client_ip: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: int = 1000,
+    current_user=Depends(get_current_user)
+):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not logged in"
+        )
+
+    columns = None
+    if fields:
+        columns = [field.strip() for field in fields.split(',')]
+        unknown = set(columns) - set(ARCHIVE_SCHEMA.names)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}"
+            )
+
+    filters = {
+        "user_id": userID,
+        "request_type": request_type,
+        "status_code": status_code,
+        "client_ip": client_ip,
+    }
+    logs = scan_archive(start, end, columns, filters, limit)
+    return {"status": "success", "logs": logs}
+
+
+@router.get('/facets', response_model=schemas.FacetsResponse,
+            status_code=status.HTTP_200_OK)
+def get_log_facets(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    host: Optional[str] = None,
+    url: Optional[str] = None,
+    request_type: Optional[str] = None,
+    status_code: Optional[int] = None,
+    client_ip: Optional[str] = None,
+    limit: int = 10,
+    current_user=Depends(get_current_user)
+):
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not logged in"
         )
 
-    logs = list(Log.find(filter_query).sort(sort_option))  # type: ignore
+    filter_query = {}
 
-    for log in logs:
-        log['user'] = str(log['user'])
+    if host:
+        filter_query["host_id"] = host_id(host)
 
-    return {"status": "success", "logs": logs}
+    if url:
+        filter_query["url_id"] = url_id(url)
+
+    if request_type:
+        filter_query["request_type"] = request_type
+
+    if status_code is not None:
+        filter_query["status_code"] = status_code
+
+    if client_ip:
+        filter_query["client_ip"] = client_ip
+
+    result = facet_counts(filter_query, start, end, limit)
+    return {"status": "success", **result}
@@ -11,6 +11,10 @@ Dependencies:
       ObjectIDs.
     - userResponseEntity from app.serializers.userSerializers: Function for
       converting a user document to a dictionary for a response.
+    - userSummaryEntity from app.serializers.userSerializers: Function for
+      converting a user summary document to a dictionary for a response.
+    - get_summary from app.summaries: Function for retrieving a user's
+      activity summary.
     - User from app.database: User collection from the MongoDB database.
     - schemas from app: Module for defining schemas.
     - require_user from app.oauth2: Function for requiring a user to be
@@ -22,16 +26,20 @@ Attributes:
 
 API Routes:
     - GET /me: Route for getting information about the current user.
+    - GET /me/summary: Route for getting the activity summary of the current
+      user.
 
 """
 
 from fastapi import APIRouter, Depends
 from bson.objectid import ObjectId
-from serializers.userSerializers import userResponseEntity
+from serializers.userSerializers import (userResponseEntity,
+                                         userSummaryEntity)
 
 from database import User
 import schemas
 from oauth2 import require_user
+from summaries import get_summary
 
 router = APIRouter()
 
@@ -40,3 +48,9 @@ router = APIRouter()
 def get_me(user_id: str = Depends(require_user)):
     user = userResponseEntity(User.find_one({'_id': ObjectId(str(user_id))}))
     return {"status": "success", "user": user}
+
+
+@router.get('/me/summary', response_model=schemas.UserSummaryResponse)
+def get_my_summary(user_id: str = Depends(require_user)):
+    summary = userSummaryEntity(get_summary(user_id))
+    return {"status": "success", "summary": summary}
@@ -0,0 +1,212 @@
+"""
+Module for adaptive sampling of repetitive logs.
+
+This module collapses bursts of identical events into aggregate documents.
+Events are keyed on (user, method, url, status). Within a time window, the
+first events of a key are stored as usual; once a key goes past that
+budget, the next event is stored as an aggregate document carrying a
+`count` and `first_seen`/`last_seen` timestamps, and every further event of
+the window only increments that aggregate. Increments are buffered in
+memory and flushed with a single `$inc`/`$max` update every few events, when
+the window of the key closes, and on shutdown. Pending increments are taken
+under the lock but written outside of it, and a write that fails is kept
+for the next flush, so a failed flush never fails the ingest of an event
+that triggered it, whatever key it belongs to. Keys that stay under the
+budget, such as ordinary browsing, are never sampled at all.
+
+The idempotency keys of collapsed events are kept with their key's state
+for the window, so a retried event is answered with its aggregate instead
+of being counted twice. If the caller fails to store the document that was
+to become the aggregate, it discards it and the next event takes its place.
+
+Events matching any of the `ALWAYS_KEEP` rules are never collapsed. Errors
+are kept by default; further rules (for example, threat detection rules)
+can be appended to the list.
+
+Dependencies:
+    - threading: threading module for guarding concurrent access.
+    - datetime from datetime: datetime class for working with dates and times.
+    - timedelta from datetime: timedelta class for representing durations.
+    - Callable from typing: Callable type hinting.
+    - PyMongoError from pymongo.errors: Base class of MongoDB errors.
+    - log_cache from app.cache: Result cache of log listings.
+    - counters from app.facets: Hourly counters of ingested logs.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+    - Log from app.database: Log collection from the MongoDB database.
+    - record_activity from app.summaries: Function for updating the activity
+      summary of a user.
+
+Classes:
+    - KeyState: Sampling state of one key in the current window.
+    - AdaptiveSampler: Sampler collapsing repeated events into aggregates.
+
+Attributes:
+    - ALWAYS_KEEP (list): Rules selecting events that are never collapsed.
+    - sampler (AdaptiveSampler): Process-wide sampler of ingested logs.
+
+"""
+
+import threading
+from datetime import datetime, timedelta
+from typing import Callable
+
+from pymongo.errors import PyMongoError
+
+from cache import log_cache
+from config import settings
+from database import Log
+from facets import counters
+from summaries import record_activity
+
+SWEEP_EVERY = 1000
+
+ALWAYS_KEEP: list[Callable[[dict], bool]] = [
+    lambda document: document['status_code'] >= 400,
+]
+
+
+class KeyState:
+    __slots__ = ('window_start', 'seen', 'aggregate', 'pending', 'last_ip',
+                 'collapsed_keys')
+
+    def __init__(self, window_start: datetime):
+        self.window_start = window_start
+        self.seen = 0
+        self.aggregate: dict | None = None
+        self.pending = 0
+        self.last_ip: str | None = None
+        self.collapsed_keys: set[str] = set()
+
+
+class AdaptiveSampler:
+    def __init__(self, window: int, keep: int, flush_every: int):
+        self.window = timedelta(seconds=window)
+        self.keep = keep
+        self.flush_every = flush_every
+        self.keys: dict[tuple, KeyState] = {}
+        self.lock = threading.Lock()
+        self.observed = 0
+        self.failed: list[tuple] = []
+
+    @staticmethod
+    def _key(document: dict) -> tuple:
+        user = document.get('user') or {}
+        return (user.get('id'), document['request_type'],
+                document['url_id'], document['status_code'])
+
+    @staticmethod
+    def _take(state: KeyState, flushes: list):
+        aggregate = state.aggregate
+        # The aggregate gets its id once the caller has stored it.
+        if aggregate is None or '_id' not in aggregate or not state.pending:
+            return
+        flushes.append((aggregate, state.pending, aggregate['last_seen'],
+                        state.last_ip))
+        state.pending = 0
+
+    def _write(self, flushes: list):
+        with self.lock:
+            flushes = self.failed + flushes
+            self.failed = []
+        for flush in flushes:
+            aggregate, pending, last_seen, last_ip = flush
+            try:
+                Log.update_one({'_id': aggregate['_id']},
+                               {'$inc': {'count': pending},
+                                '$max': {'last_seen': last_seen}})
+            except PyMongoError as error:
+                print(f'Unable to update aggregate {aggregate["_id"]}: '
+                      f'{error}')
+                with self.lock:
+                    self.failed.append(flush)
+                continue
+            user = aggregate.get('user') or {}
+            if user.get('id'):
+                try:
+                    record_activity(user['id'], aggregate['status_code'],
+                                    last_ip, last_seen, pending)
+                except PyMongoError as error:
+                    print(f'Unable to update the summary of {user["id"]}: '
+                          f'{error}')
+            counters.add(aggregate, pending)
+            log_cache.bump()
+
+    def _sweep(self, now: datetime, flushes: list):
+        for key, state in list(self.keys.items()):
+            if now - state.window_start >= self.window:
+                self._take(state, flushes)
+                del self.keys[key]
+
+    def observe(self, document: dict) -> dict | None:
+        """
+        Return None if the document has to be stored by the caller, or the
+        aggregate document it was collapsed into. When a key first goes over
+        its budget, the document itself becomes the aggregate of the window
+        and is returned as None to be stored.
+        """
+        if any(rule(document) for rule in ALWAYS_KEEP):
+            return None
+        now = document['created_at']
+        key = self._key(document)
+        flushes: list = []
+        try:
+            with self.lock:
+                return self._observe(document, key, now, flushes)
+        finally:
+            if flushes:
+                self._write(flushes)
+
+    def _observe(self, document: dict, key: tuple, now: datetime,
+                 flushes: list) -> dict | None:
+        self.observed += 1
+        if self.observed % SWEEP_EVERY == 0:
+            self._sweep(now, flushes)
+        state = self.keys.get(key)
+        if state is None or now - state.window_start >= self.window:
+            if state is not None:
+                self._take(state, flushes)
+            state = self.keys[key] = KeyState(now)
+        idempotency_key = document.get('idempotency_key')
+        if (idempotency_key and state.aggregate is not None
+                and idempotency_key in state.collapsed_keys):
+            return state.aggregate
+        state.seen += 1
+        if state.seen <= self.keep:
+            return None
+        if state.aggregate is None:
+            document.update(count=1, first_seen=now, last_seen=now)
+            state.aggregate = document
+            return None
+        state.pending += 1
+        state.aggregate['count'] += 1
+        state.aggregate['last_seen'] = now
+        state.last_ip = document['client_ip']
+        if idempotency_key:
+            state.collapsed_keys.add(idempotency_key)
+        if state.pending >= self.flush_every:
+            self._take(state, flushes)
+        return state.aggregate
+
+    def discard(self, document: dict):
+        """
+        Forget a document that was to become an aggregate but could not be
+        stored, so that the next event of its key becomes the aggregate.
+        """
+        with self.lock:
+            state = self.keys.get(self._key(document))
+            if state is not None and state.aggregate is document:
+                state.aggregate = None
+                state.pending = 0
+
+    def flush_all(self):
+        flushes: list = []
+        with self.lock:
+            for state in self.keys.values():
+                self._take(state, flushes)
+        self._write(flushes)
+
+
+sampler = AdaptiveSampler(settings.SAMPLING_WINDOW_SECONDS,
+                          settings.SAMPLING_KEEP_PER_WINDOW,
+                          settings.SAMPLING_FLUSH_EVERY)
@@ -16,10 +16,23 @@ Models:
     - LoginUserSchema (BaseModel): Schema for user login.
     - UserResponseSchema (UserBaseSchema): Schema for user response.
     - UserResponse (BaseModel): Response schema for user data.
+    - UserSummarySchema (BaseModel): Schema for user activity summary.
+    - UserSummaryResponse (BaseModel): Response schema for user activity
+      summary.
     - LogSchema (BaseModel): Schema for log data.
     - LogResponseSchema (LogSchema): Schema for log response.
     - LogResponse (BaseModel): Response schema for log data.
     - LogsResponse (BaseModel): Response schema for list of logs.
+    - ArchivedLogSchema (BaseModel): Schema for archived log data.
+    - ArchivedLogsResponse (BaseModel): Response schema for list of archived
+      logs.
+    - ProfileSchema (BaseModel): Schema for stored request profile data.
+    - ProfilesResponse (BaseModel): Response schema for list of stored request
+      profiles.
+    - FacetValueSchema (BaseModel): Schema for the count of one facet value.
+    - FacetSchema (BaseModel): Schema for the counts of one facet.
+    - FacetsResponse (BaseModel): Response schema for log totals and facet
+      counts.
 
 """
 
@@ -60,6 +73,19 @@ class UserResponse(BaseModel):
     user: UserResponseSchema
 
 
+class UserSummarySchema(BaseModel):
+    log_count: int
+    error_count: int
+    error_rate: float
+    last_seen_at: datetime | None
+    last_ip: str | None
+
+
+class UserSummaryResponse(BaseModel):
+    status: str
+    summary: UserSummarySchema
+
+
 class LogSchema(BaseModel):
     request_type: str
     url: str
@@ -76,21 +102,75 @@ class LogSchema(BaseModel):
 
 class LogResponseSchema(LogSchema):
     id: str
+    count: int = 1
+    first_seen: datetime | None
+    last_seen: datetime | None
 
 
 class LogResponse(BaseModel):
     status: str
-    log: LogSchema
+    log: LogResponseSchema
 
 
 class LogsResponse(BaseModel):
     status: str
-    logs: list[LogSchema]
+    logs: list[LogResponseSchema]
+
+
+class ArchivedLogSchema(BaseModel):
+    id: str | None
+    created_at: datetime | None
+    updated_at: datetime | None
+    request_type: str | None
+    url: str | None
+    client_ip: str | None
+    status_code: int | None
+    user_id: str | None
+    user_email: str | None
+    count: int | None
+    first_seen: datetime | None
+    last_seen: datetime | None
+
+
+class ArchivedLogsResponse(BaseModel):
+    status: str
+    logs: list[ArchivedLogSchema]
+
+
+class ProfileSchema(BaseModel):
+    name: str
+    size: int
+    created_at: datetime
+
+
+class ProfilesResponse(BaseModel):
+    status: str
+    profiles: list[ProfileSchema]
+
+
+class FacetValueSchema(BaseModel):
+    value: int | str | None
+    count: int
+
+
+class FacetSchema(BaseModel):
+    field: str
+    exact: bool
+    values: list[FacetValueSchema]
+
+
+class FacetsResponse(BaseModel):
+    status: str
+    total: int
+    total_exact: bool
+    facets: list[FacetSchema]
     
 class CreateLogSchema(BaseModel):
     request_type: str
     url: str
     status_code: int
+    idempotency_key: str | None = None
+    timestamp: datetime | None = None
     
     class Config:
         orm_mode = True
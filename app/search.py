@@ -0,0 +1,142 @@
+"""
+Module for substring search over logged URLs.
+
+This module maintains a trigram inverted index over the shared URL table.
+Logs reference their URL by id, and the number of distinct URLs is tiny
+compared to the number of logs, so the index is built over URLs rather than
+over log documents: a substring query is answered by intersecting trigram
+posting lists into a set of candidate URL ids, checking the candidates
+against their actual URL, and only then looking up logs by the indexed
+`url_id` field.
+
+Each posting is stored as one `{gram, url_id}` document in the "url_grams"
+collection under a unique compound index, so posting lists have no size
+limit and every lookup is an index range scan. Lists are intersected from
+the rarest trigram up, and intersection stops early once the candidate set
+is small enough to check directly.
+
+URLs are indexed when they are first interned. The backfill job indexes
+URLs interned before the index existed, and moves logs that still store
+their URL as a string to the URL table.
+
+Usage:
+    python search.py
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - re: re module for escaping short queries.
+    - UpdateOne from pymongo: UpdateOne class for bulk writes.
+    - log_cache from app.cache: Result cache of log listings.
+    - Log from app.database: Log collection from the MongoDB database.
+    - Url from app.database: Url collection from the MongoDB database.
+    - UrlGram from app.database: UrlGram collection from the MongoDB database.
+
+Functions:
+    - trigrams(text): Function to split a text into its trigrams.
+    - index_url(url_id, url): Function to add a URL to the trigram index.
+    - find_url_ids(query): Function to find the ids of URLs containing a
+      substring.
+    - backfill(batch_size): Function to index URLs and logs written before
+      the index existed.
+    - main(): Command line entry point.
+
+"""
+
+import argparse
+import re
+
+from pymongo import UpdateOne
+
+from cache import log_cache
+from database import Log, Url, UrlGram
+
+CANDIDATE_CHECK_LIMIT = 256
+
+
+def trigrams(text: str) -> set[str]:
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def index_url(url_id: int, url: str):
+    grams = trigrams(url)
+    if grams:
+        UrlGram.bulk_write([
+            UpdateOne({'gram': gram, 'url_id': url_id},
+                      {'$setOnInsert': {'gram': gram, 'url_id': url_id}},
+                      upsert=True)
+            for gram in grams], ordered=False)
+
+
+def _matching(url_ids, query: str) -> list[int]:
+    query = query.lower()
+    return [row['_id'] for row in Url.find({'_id': {'$in': list(url_ids)}},
+                                           {'url': 1})
+            if query in row['url'].lower()]
+
+
+def find_url_ids(query: str) -> list[int]:
+    grams = trigrams(query)
+    if not grams:
+        # Too short to use the index, but the URL table is small.
+        return [row['_id'] for row in Url.find(
+            {'url': {'$regex': re.escape(query), '$options': 'i'}},
+            {'_id': 1})]
+    counts = sorted((UrlGram.count_documents({'gram': gram}), gram)
+                    for gram in grams)
+    if counts[0][0] == 0:
+        return []
+    candidates = None
+    for _, gram in counts:
+        query_filter: dict = {'gram': gram}
+        if candidates is not None:
+            query_filter['url_id'] = {'$in': list(candidates)}
+        candidates = {row['url_id'] for row in UrlGram.find(
+            query_filter, {'_id': 0, 'url_id': 1})}
+        if len(candidates) <= CANDIDATE_CHECK_LIMIT:
+            break
+    return _matching(candidates, query)
+
+
+def backfill(batch_size: int) -> tuple[int, int]:
+    # Imported here, as the URL table itself depends on this module.
+    from urls import intern_url  # pylint: disable=import-outside-toplevel
+
+    migrated = 0
+    requests = []
+    for log in Log.find({'url': {'$exists': True}}, {'url': 1},
+                        batch_size=batch_size):
+        new_url_id, new_host_id, _ = intern_url(log['url'])
+        requests.append(UpdateOne(
+            {'_id': log['_id']},
+            {'$set': {'url_id': new_url_id, 'host_id': new_host_id},
+             '$unset': {'url': ''}}))
+        if len(requests) == batch_size:
+            Log.bulk_write(requests, ordered=False)
+            migrated += len(requests)
+            requests = []
+    if requests:
+        Log.bulk_write(requests, ordered=False)
+        migrated += len(requests)
+    if migrated:
+        log_cache.bump_shared()
+
+    indexed = 0
+    for row in Url.find({}, {'url': 1}, batch_size=batch_size):
+        index_url(row['_id'], row['url'])
+        indexed += 1
+    return migrated, indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Build the trigram index over logged URLs.')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Number of logs migrated per bulk write.')
+    args = parser.parse_args()
+    migrated, indexed = backfill(args.batch_size)
+    print(f'Migrated {migrated} logs, indexed {indexed} URLs')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,8 @@
 Module for defining entity functions for log data.
 
 This module provides functions for converting log data between different
-representations.
+representations. Logs store their URL as an id into the shared URL table,
+which is resolved back to the URL string here.
 
 Functions:
     - logEntity(log): Function to convert a log document to a dictionary.
@@ -10,9 +11,13 @@ Functions:
       dictionary for a response.
     - logListEntity(logs): Function to convert a list of log documents to a
       list of dictionaries.
+    - resolveLogUrls(logs): Function to fill in the URL of a list of log
+      documents.
 
 """
 
+from urls import resolve_url, resolve_urls
+
 
 def logEntity(log) -> dict:
     return {
@@ -20,7 +25,7 @@ def logEntity(log) -> dict:
         "created_at": log["created_at"],
         "updated_at": log["updated_at"],
         "request_type": log["request_type"],
-        "url": log["url"],
+        "url": log.get("url") or resolve_url(log["url_id"]),
         "client_ip": log["client_ip"],
         "status_code": log["status_code"],
         "user": log["user"]
@@ -33,12 +38,23 @@ def logResponseEntity(log) -> dict:
         "created_at": log["created_at"],
         "updated_at": log["updated_at"],
         "request_type": log["request_type"],
-        "url": log["url"],
+        "url": log.get("url") or resolve_url(log["url_id"]),
         "client_ip": log["client_ip"],
         "status_code": log["status_code"],
-        "user": log["user"]
+        "user": log["user"],
+        "count": log.get("count", 1),
+        "first_seen": log.get("first_seen"),
+        "last_seen": log.get("last_seen")
     }
 
 
 def logListEntity(logs) -> list:
     return [logEntity(log) for log in logs]
+
+
+def resolveLogUrls(logs) -> list:
+    urls = resolve_urls(log["url_id"] for log in logs if "url" not in log)
+    for log in logs:
+        if "url" not in log:
+            log["url"] = urls.get(log["url_id"])
+    return logs
@@ -10,8 +10,12 @@ Functions:
       dictionary for a response.
     - embeddedUserResponse(user): Function to convert a user document to a
       dictionary for an embedded response.
+    - logUserEntity(user): Function to convert a user document to the
+      dictionary embedded in its logs.
     - userListEntity(users): Function to convert a list of user documents to a
       list of dictionaries.
+    - userSummaryEntity(summary): Function to convert a user summary document
+      to a dictionary for a response.
 
 """
 
@@ -51,5 +55,30 @@ def embeddedUserResponse(user) -> dict:
     }
 
 
+def logUserEntity(user) -> dict:
+    return {
+        "name": user["name"],
+        "email": user["email"],
+        "photo": user["photo"],
+        "role": user["role"],
+        "created_at": user["created_at"],
+        "updated_at": user["updated_at"],
+        "id": str(user["_id"])
+    }
+
+
 def userListEntity(users) -> list:
     return [userEntity(user) for user in users]
+
+
+def userSummaryEntity(summary) -> dict:
+    summary = summary or {}
+    log_count = summary.get("log_count", 0)
+    error_count = summary.get("error_count", 0)
+    return {
+        "log_count": log_count,
+        "error_count": error_count,
+        "error_rate": error_count / log_count if log_count else 0.0,
+        "last_seen_at": summary.get("last_seen_at"),
+        "last_ip": summary.get("last_ip")
+    }
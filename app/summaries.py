@@ -0,0 +1,111 @@
+"""
+Module for maintaining per-user activity summaries.
+
+This module keeps one summary document per user in the "user_summaries"
+collection, keyed by the user's id. Every log write updates the summary in
+place with atomic `$inc`/`$max` operators, so the totals can be served in
+constant time regardless of how many logs a user has.
+
+Summaries of logs written before they existed are rebuilt by the backfill
+job, which aggregates the "logs" collection by user and replaces each
+user's summary with the result. It overwrites increments made while it
+runs, so it is meant to be run once, right after deploying.
+
+Usage:
+    python summaries.py
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - datetime from datetime: datetime class for working with dates and times.
+    - ObjectId from bson.objectid: ObjectId class for working with MongoDB
+      ObjectIDs.
+    - ReplaceOne from pymongo: ReplaceOne class for bulk writes.
+    - Log from app.database: Log collection from the MongoDB database.
+    - UserSummary from app.database: UserSummary collection from the MongoDB
+      database.
+
+Functions:
+    - record_activity(user_id, status_code, client_ip, seen_at, count):
+      Function to add log writes to a user's summary.
+    - get_summary(user_id): Function to retrieve a user's summary.
+    - backfill(batch_size): Function to rebuild the summaries of every user
+      from their logs.
+    - main(): Command line entry point.
+
+"""
+
+import argparse
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo import ReplaceOne
+
+from database import Log, UserSummary
+
+WEIGHT = {'$ifNull': ['$count', 1]}
+
+
+def record_activity(user_id: str, status_code: int, client_ip: str | None,
+                    seen_at: datetime, count: int = 1):
+    update: dict = {
+        '$inc': {
+            'log_count': count,
+            'error_count': count if status_code >= 400 else 0
+        },
+        '$max': {'last_seen_at': seen_at}
+    }
+    if client_ip:
+        update['$set'] = {'last_ip': client_ip}
+    UserSummary.update_one({'_id': ObjectId(str(user_id))}, update,
+                           upsert=True)
+
+
+def get_summary(user_id: str):
+    return UserSummary.find_one({'_id': ObjectId(str(user_id))})
+
+
+def backfill(batch_size: int) -> int:
+    # Logs written by the API embed the user's id as a string, logs written
+    # by the authentication routes embed the whole user document.
+    user_id = {'$ifNull': ['$user.id', {'$toString': '$user._id'}]}
+    pipeline = [
+        {'$match': {'user': {'$ne': None}}},
+        {'$sort': {'created_at': 1}},
+        {'$group': {
+            '_id': user_id,
+            'log_count': {'$sum': WEIGHT},
+            'error_count': {'$sum': {'$cond': [
+                {'$gte': ['$status_code', 400]}, WEIGHT, 0]}},
+            'last_seen_at': {'$max': {'$ifNull': ['$last_seen',
+                                                  '$created_at']}},
+            'last_ip': {'$last': '$client_ip'}}}
+    ]
+    rebuilt = 0
+    requests = []
+    for row in Log.aggregate(pipeline, allowDiskUse=True):
+        if not row['_id']:
+            continue
+        key = ObjectId(row.pop('_id'))
+        requests.append(ReplaceOne({'_id': key}, row, upsert=True))
+        if len(requests) == batch_size:
+            UserSummary.bulk_write(requests, ordered=False)
+            rebuilt += len(requests)
+            requests = []
+    if requests:
+        UserSummary.bulk_write(requests, ordered=False)
+        rebuilt += len(requests)
+    return rebuilt
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rebuild the activity summaries of every user.')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Number of summaries replaced per bulk write.')
+    args = parser.parse_args()
+    rebuilt = backfill(args.batch_size)
+    print(f'Rebuilt the summaries of {rebuilt} users')
+
+
+if __name__ == '__main__':
+    main()
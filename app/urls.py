@@ -0,0 +1,144 @@
+"""
+Module for dictionary-encoded URL storage.
+
+This module interns logged URLs into the shared "urls" collection. A URL is
+normalized, split into host, path and query, and keyed by a 64-bit hash of
+its normalized form. Normalization only lowercases the scheme and host and
+drops default ports: the userinfo and fragment are kept, since for logged
+traffic they are evidence (`http://evil@good.com/` is not
+`http://good.com/`). URLs that cannot be parsed, including those with an
+invalid port, are interned as is, without a host, and the URL table also
+keeps the raw string the URL was first seen as. Logs then store only the
+hash of the URL (`url_id`) and the hash of the host (`host_id`). Since
+device traffic hits the same few thousand URLs over and over, this keeps
+log documents and their indexes small and turns filtering by URL or host
+into an integer equality lookup.
+
+Interning and resolution both go through an in-process LRU cache, so a URL
+already seen by the process costs no database round trip in either
+direction. A URL stored for the first time is also added to the trigram
+index used for substring search.
+
+Dependencies:
+    - hashlib: hashlib module for hashing URLs.
+    - urlsplit from urllib.parse: urlsplit function for parsing URLs.
+    - LRUCache from app.cache: LRUCache class for caching URLs.
+    - settings from app.config: settings module for accessing configuration
+      variables.
+    - Url from app.database: Url collection from the MongoDB database.
+    - index_url from app.search: Function for adding a URL to the trigram
+      index.
+
+Functions:
+    - normalize_url(url): Function to normalize a URL and split it into its
+      parts.
+    - hash_id(value): Function to compute the 64-bit id of a string.
+    - url_id(url): Function to compute the id of a URL.
+    - host_id(host): Function to compute the id of a host.
+    - intern_url(url): Function to store a URL in the URL table and return
+      its ids and normalized form.
+    - compact_url(document): Function to replace the URL of a log document
+      with its ids.
+    - resolve_url(url_id): Function to resolve a URL id.
+    - resolve_urls(url_ids): Function to resolve many URL ids at once.
+
+"""
+
+import hashlib
+from urllib.parse import urlsplit
+
+from cache import LRUCache
+from config import settings
+from database import Url
+from search import index_url
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+_urls = LRUCache(settings.URL_CACHE_SIZE)
+
+
+def normalize_url(url: str) -> dict:
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        hostname = parts.hostname
+        port = parts.port
+    except ValueError:
+        # Malformed URLs, invalid ports included, are kept verbatim rather
+        # than rejected or folded into a well-formed URL.
+        return {'url': url, 'scheme': '', 'host': '', 'path': url,
+                'query': '', 'malformed': True}
+    scheme = parts.scheme.lower()
+    host = (hostname or '').lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = f'{host}:{port}'
+    userinfo = parts.netloc.rpartition('@')[0] if '@' in parts.netloc else ''
+    authority = f'{userinfo}@{host}' if userinfo else host
+    path = parts.path or '/'
+    normalized = (f'{scheme}://{authority}{path}' if scheme or authority
+                  else path)
+    if parts.query:
+        normalized = f'{normalized}?{parts.query}'
+    if parts.fragment:
+        normalized = f'{normalized}#{parts.fragment}'
+    return {'url': normalized, 'scheme': scheme, 'host': host,
+            'userinfo': userinfo, 'path': path, 'query': parts.query,
+            'fragment': parts.fragment}
+
+
+def hash_id(value: str) -> int:
+    # Signed, so that the id fits a BSON int64.
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'),
+                                          digest_size=8).digest(),
+                          'little', signed=True)
+
+
+def url_id(url: str) -> int:
+    return hash_id(normalize_url(url)['url'])
+
+
+def host_id(host: str) -> int:
+    return hash_id(host.strip().lower())
+
+
+def intern_url(url: str) -> tuple[int, int, str]:
+    parts = normalize_url(url)
+    new_url_id = hash_id(parts['url'])
+    new_host_id = hash_id(parts['host'])
+    if _urls.get(new_url_id) is None:
+        result = Url.update_one(
+            {'_id': new_url_id},
+            {'$setOnInsert': {**parts, 'raw': url,
+                              'host_id': new_host_id}},
+            upsert=True)
+        if result.upserted_id is not None:
+            index_url(new_url_id, parts['url'])
+        _urls.put(new_url_id, parts['url'])
+    return new_url_id, new_host_id, parts['url']
+
+
+def compact_url(document: dict) -> dict:
+    document['url_id'], document['host_id'], _ = intern_url(
+        document.pop('url'))
+    return document
+
+
+def resolve_urls(url_ids) -> dict:
+    resolved = {}
+    missing = []
+    for key in set(url_ids):
+        url = _urls.get(key)
+        if url is None:
+            missing.append(key)
+        else:
+            resolved[key] = url
+    if missing:
+        for row in Url.find({'_id': {'$in': missing}}, {'url': 1}):
+            _urls.put(row['_id'], row['url'])
+            resolved[row['_id']] = row['url']
+    return resolved
+
+
+def resolve_url(key: int) -> str | None:
+    return resolve_urls([key]).get(key)
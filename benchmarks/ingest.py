@@ -0,0 +1,215 @@
+"""
+Benchmark of the log ingest pipeline.
+
+This script compares the per-request CPU time, peak allocated memory,
+allocated memory blocks and database round trips of the Pydantic-based
+ingest path used by `create_log` before the lean pipeline, and of the lean
+`LogRecord` path used now. Both paths include the update of the user's
+activity summary that `create_log` makes on every request, so the lean path
+makes one read-free log write plus the summary update. Both paths run
+against in-memory collections, so the numbers isolate the work done by the
+application itself from MongoDB latency; the authentication, duplicate
+suppression and sampling steps shared by both paths are left out.
+
+Allocated blocks are counted from tracemalloc snapshots taken before and
+after a run of requests, so they count the blocks each request leaves
+allocated (the stored log, cached URLs, ...), not short-lived temporaries.
+
+Usage:
+    python benchmarks/ingest.py [--requests 20000]
+
+Dependencies:
+    - argparse: argparse module for parsing command line arguments.
+    - base64: base64 module for building placeholder settings.
+    - os: os module for setting placeholder settings.
+    - sys: sys module for importing the application modules.
+    - time: time module for measuring CPU time.
+    - tracemalloc: tracemalloc module for measuring allocations.
+    - types: types module for building the in-memory database module.
+    - datetime from datetime: datetime class for working with dates and times.
+    - ObjectId from bson: ObjectId class for generating document ids.
+
+"""
+
+import argparse
+import base64
+import os
+import sys
+import time
+import tracemalloc
+import types
+from datetime import datetime
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+for name, value in {
+        'DATABASE_URL': 'mongodb://localhost:27017',
+        'MONGO_INITDB_DATABASE': 'benchmark',
+        'JWT_PUBLIC_KEY': base64.b64encode(b'public').decode(),
+        'JWT_PRIVATE_KEY': base64.b64encode(b'private').decode(),
+        'REFRESH_TOKEN_EXPIRES_IN': '60',
+        'ACCESS_TOKEN_EXPIRES_IN': '15',
+        'JWT_ALGORITHM': 'RS256',
+        'CLIENT_ORIGIN': 'http://localhost:3000',
+        'MONGO_INITDB_ROOT_USERNAME': 'benchmark',
+        'MONGO_INITDB_ROOT_PASSWORD': 'benchmark'}.items():
+    os.environ.setdefault(name, value)
+
+
+class MemoryCollection:
+    def __init__(self):
+        self.documents: dict = {}
+        self.round_trips = 0
+
+    def insert_one(self, document: dict):
+        self.round_trips += 1
+        document.setdefault('_id', ObjectId())
+        self.documents[document['_id']] = dict(document)
+        return types.SimpleNamespace(inserted_id=document['_id'])
+
+    def find_one(self, query: dict):
+        self.round_trips += 1
+        document = self.documents.get(query['_id'])
+        return dict(document) if document else None
+
+    def update_one(self, query: dict, update: dict, upsert: bool = False):
+        self.round_trips += 1
+        if query['_id'] in self.documents or not upsert:
+            return types.SimpleNamespace(upserted_id=None)
+        self.documents[query['_id']] = {'_id': query['_id'],
+                                        **update.get('$setOnInsert', {})}
+        return types.SimpleNamespace(upserted_id=query['_id'])
+
+    def bulk_write(self, requests, ordered: bool = True):
+        self.round_trips += 1
+
+
+database = types.ModuleType('database')
+for collection in ('User', 'Log', 'Url', 'UrlGram', 'CacheVersion',
+                   'UserSummary'):
+    setattr(database, collection, MemoryCollection())
+sys.modules['database'] = database
+
+# pylint: disable=wrong-import-position
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+import schemas
+from records import LogRecord
+from serializers.logSerializers import logResponseEntity
+from serializers.userSerializers import logUserEntity
+from summaries import record_activity
+from urls import compact_url, intern_url
+
+Log = database.Log
+User = database.User
+UserSummary = database.UserSummary
+
+
+def pydantic_ingest(payload: schemas.CreateLogSchema, user_id: ObjectId,
+                    client_ip: str) -> bytes:
+    new_log = schemas.LogSchema(
+        request_type=payload.request_type,
+        url=payload.url,
+        client_ip=None,
+        status_code=payload.status_code,
+        user=None,
+        created_at=datetime.utcnow(),
+        updated_at=datetime.utcnow()
+    )
+    new_log.client_ip = client_ip
+    db_user = User.find_one({'_id': user_id})
+    new_log.user = schemas.UserResponseSchema(
+        id=str(db_user["_id"]),
+        name=db_user["name"],
+        email=db_user["email"],
+        photo=db_user["photo"],
+        role=db_user["role"],
+        created_at=db_user["created_at"],
+        updated_at=db_user["updated_at"]
+    )
+    result = Log.insert_one(compact_url(new_log.dict()))
+    record_activity(str(user_id), new_log.status_code, new_log.client_ip,
+                    new_log.created_at)
+    response_log = logResponseEntity(Log.find_one({'_id': result.inserted_id}))
+    # FastAPI validates the returned value against the response model.
+    response = schemas.LogResponse(status="success", log=response_log)
+    return JSONResponse(content=jsonable_encoder(response)).body
+
+
+def lean_ingest(payload: schemas.CreateLogSchema, db_user: dict,
+                client_ip: str) -> bytes:
+    new_url_id, new_host_id, url = intern_url(payload.url)
+    record = LogRecord(
+        request_type=payload.request_type,
+        url=url,
+        url_id=new_url_id,
+        host_id=new_host_id,
+        client_ip=client_ip,
+        status_code=payload.status_code,
+        user=logUserEntity(db_user)
+    )
+    Log.insert_one(record.to_document())
+    record_activity(str(db_user['_id']), record.status_code,
+                    record.client_ip, record.created_at)
+    return ORJSONResponse(content={"status": "success",
+                                   "log": record.to_response()}).body
+
+
+def measure(name: str, ingest, argument, payloads: list):
+    ingest(payloads[0], argument, '10.0.0.1')
+    Log.round_trips = User.round_trips = UserSummary.round_trips = 0
+
+    started = time.process_time()
+    for payload in payloads:
+        ingest(payload, argument, '10.0.0.1')
+    cpu = (time.process_time() - started) / len(payloads)
+    round_trips = (Log.round_trips + User.round_trips +
+                   UserSummary.round_trips) / len(payloads)
+
+    tracemalloc.start()
+    peaks = []
+    sample = payloads[:1000]
+    before = tracemalloc.take_snapshot()
+    for payload in sample:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        ingest(payload, argument, '10.0.0.1')
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(
+        before, 'lineno') if stat.count_diff > 0) / len(sample)
+
+    print(f'{name:<10} {cpu * 1e6:>10.1f} us/request'
+          f' {sum(peaks) / len(peaks) / 1024:>8.1f} KiB peak/request'
+          f' {blocks:>8.1f} blocks/request'
+          f' {round_trips:>4.1f} round trips/request')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the log ingest pipeline.')
+    parser.add_argument('--requests', type=int, default=20000,
+                        help='Number of ingested logs per path.')
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    db_user = {'_id': ObjectId(), 'name': 'John Smith',
+               'email': 'johnsmith@gmail.com', 'photo': 'default.png',
+               'role': 'user', 'verified': True, 'password': 'hash',
+               'created_at': now, 'updated_at': now}
+    User.insert_one(db_user)
+    payloads = [schemas.CreateLogSchema(
+        request_type='GET',
+        url=f'https://device.example.com/api/v1/poll?page={i % 50}',
+        status_code=200) for i in range(args.requests)]
+
+    measure('pydantic', pydantic_ingest, db_user['_id'], payloads)
+    measure('lean', lean_ingest, db_user, payloads)
+
+
+if __name__ == '__main__':
+    main()